@@ -0,0 +1,59 @@
+from typing import Awaitable, Callable, Dict, Hashable
+import asyncio
+import traceback
+
+# A piece of work for an actor to run
+Job = Callable[[], Awaitable[None]]
+
+# How many seconds an actor waits for work before shutting down
+IDLE_TIMEOUT = 300
+
+# A worker task with its own queue of jobs, which it runs one at a time in the
+# order they were submitted
+class Actor:
+    def __init__(self, key: Hashable, pool: 'ActorPool') -> None:
+        self.key = key
+        self.pool = pool
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task = asyncio.ensure_future(self.run())
+
+    async def run(self) -> None:
+        while True:
+            try:
+                job = await asyncio.wait_for(self.queue.get(),
+                                             self.pool.idle_timeout)
+            except asyncio.TimeoutError:
+                # Nothing can be submitted between checking the queue and
+                # leaving the pool, since neither awaits
+                if self.queue.empty():
+                    self.pool.retire(self)
+                    return
+                continue
+            try:
+                await job()
+            except Exception:
+                # One bad command shouldn't stop the rest of the table's
+                # commands from running
+                traceback.print_exc()
+
+# Runs jobs on actors, one per key. Jobs with the same key run strictly in
+# order, while jobs with different keys run independently of each other.
+# Actors are started when a key gets its first job, and shut down after they've
+# been idle for idle_timeout seconds
+class ActorPool:
+    def __init__(self, idle_timeout: float = IDLE_TIMEOUT) -> None:
+        self.idle_timeout = idle_timeout
+        self.actors: Dict[Hashable, Actor] = {}
+
+    # Queues a job to be run by the actor for the given key
+    def submit(self, key: Hashable, job: Job) -> None:
+        actor = self.actors.get(key)
+        if actor is None:
+            actor = Actor(key, self)
+            self.actors[key] = actor
+        actor.queue.put_nowait(job)
+
+    # Removes an idle actor from the pool
+    def retire(self, actor: Actor) -> None:
+        if self.actors.get(actor.key) is actor:
+            del self.actors[actor.key]
@@ -0,0 +1,185 @@
+from datetime import datetime
+from typing import Callable, Dict, List
+import argparse
+import json
+import platform
+import random
+import secrets
+import subprocess
+import sys
+import time
+
+from game import Game, GameState
+from player import Player
+from entropy import EntropyPool
+from poker import best_possible_hand, CARDS, Deck, Hand
+from pot import PotManager
+from simulate import play_hand, random_policy
+
+# Runs a function over and over for about the given number of seconds, and
+# returns how many times it ran per second. The function returns how many
+# operations it did each time it ran
+def measure(run: Callable[[], int], seconds: float) -> float:
+    operations = 0
+    start = time.perf_counter()
+    end = start + seconds
+    while True:
+        operations += run()
+        now = time.perf_counter()
+        if now >= end:
+            return operations / (now - start)
+
+# Deals some random seven-card hands to benchmark the evaluator with
+def random_deals(count: int) -> List[list]:
+    deals = []
+    for _ in range(count):
+        deck = Deck()
+        deals.append([deck.draw() for _ in range(7)])
+    return deals
+
+def bench_hand(seconds: float) -> float:
+    deals = random_deals(1000)
+    def run() -> int:
+        for deal in deals:
+            Hand(deal[:5])
+        return len(deals)
+    return measure(run, seconds)
+
+def bench_best_possible_hand(seconds: float) -> float:
+    deals = random_deals(1000)
+    def run() -> int:
+        for deal in deals:
+            best_possible_hand(deal[:5], (deal[5], deal[6]))
+        return len(deals)
+    return measure(run, seconds)
+
+# Shuffles a deck with the standard library's Mersenne Twister, which is fast
+# but predictable
+def bench_random_shuffle(seconds: float) -> float:
+    cards = list(CARDS)
+    def run() -> int:
+        for _ in range(1000):
+            random.shuffle(cards)
+        return 1000
+    return measure(run, seconds)
+
+# Shuffles a deck securely, with entropy read from the operating system in bulk
+def bench_secure_shuffle(seconds: float) -> float:
+    cards = list(CARDS)
+    pool = EntropyPool()
+    def run() -> int:
+        for _ in range(1000):
+            pool.shuffle(cards)
+        return 1000
+    return measure(run, seconds)
+
+# Shuffles a deck securely the simple way, asking the secrets module for each
+# swap, to compare the entropy pool against
+def bench_secrets_shuffle(seconds: float) -> float:
+    cards = list(CARDS)
+    def run() -> int:
+        for _ in range(100):
+            for i in range(len(cards) - 1, 0, -1):
+                j = secrets.randbelow(i + 1)
+                cards[i], cards[j] = cards[j], cards[i]
+        return 100
+    return measure(run, seconds)
+
+# Plays out a betting round at a ten-player table of short stacks, where each
+# player raises or goes all in, building up a pile of side pots
+def bench_pot_manager(seconds: float) -> float:
+    rng = random.Random(0)
+    stacks = [[rng.randint(10, 500) for _ in range(10)] for _ in range(100)]
+    def run() -> int:
+        for balances in stacks:
+            players = [Player(i, f"player{i}") for i in range(len(balances))]
+            for player, balance in zip(players, balances):
+                player.balance = balance
+            pot = PotManager()
+            pot.new_hand(players)
+            pot.pay_blind(players[0], 5)
+            pot.pay_blind(players[1], 10)
+            for i, player in enumerate(players):
+                if i % 3 == 0 and player.max_bet > pot.cur_bet:
+                    pot.handle_raise(player, player.max_bet - pot.cur_bet)
+                else:
+                    pot.handle_call(player)
+            pot.round_over()
+            pot.betting_over()
+            pot.value
+        return len(stacks)
+    return measure(run, seconds)
+
+# Plays full hands at six-player tables, starting a new game whenever one ends
+def bench_game(seconds: float) -> float:
+    rng = random.Random(0)
+    random.seed(0)
+    game = Game()
+    policies = {}
+    def run() -> int:
+        if game.state == GameState.NO_GAME:
+            game.new_game()
+            for i in range(6):
+                game.add_player(i, f"player{i}")
+            game.start()
+            policies.clear()
+            for player in game.players:
+                policies[player] = random_policy
+        play_hand(game, policies, rng)
+        return 1
+    return measure(run, seconds)
+
+BENCHMARKS: Dict[str, Callable[[float], float]] = {
+    "hand_per_sec": bench_hand,
+    "best_possible_hand_per_sec": bench_best_possible_hand,
+    "random_shuffle_per_sec": bench_random_shuffle,
+    "secure_shuffle_per_sec": bench_secure_shuffle,
+    "secrets_shuffle_per_sec": bench_secrets_shuffle,
+    "pot_round_per_sec": bench_pot_manager,
+    "game_hand_per_sec": bench_game,
+}
+
+# Returns the commit that's checked out, so results can be matched up with it
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measures how fast the poker engine runs")
+    parser.add_argument("--seconds", type=float, default=2.0,
+                        help="how long to run each benchmark for")
+    parser.add_argument("--output", default=None,
+                        help="write the results as JSON to this file "
+                             "(default: print them)")
+    parser.add_argument("benchmarks", nargs="*",
+                        help="which benchmarks to run, out of "
+                             f"{', '.join(BENCHMARKS)} (default: all)")
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(f"there's no benchmark called '{name}'")
+
+    results = {
+        "commit": git_commit(),
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "seconds": args.seconds,
+        "results": {},
+    }
+    for name in args.benchmarks or BENCHMARKS:
+        rate = BENCHMARKS[name](args.seconds)
+        results["results"][name] = round(rate, 1)
+        print(f"{name}: {rate:,.1f}", file=sys.stderr)
+
+    if args.output is None:
+        print(json.dumps(results, indent=2))
+    else:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+if __name__ == "__main__":
+    main()
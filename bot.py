@@ -1,23 +1,69 @@
 from collections import namedtuple
+import asyncio
 import os
-from typing import Dict, List
+import time
+import traceback
+from typing import Awaitable, Dict, List, Optional, Set
 
 import discord
+from dotenv import load_dotenv
 
-from game import Game, GAME_OPTIONS, GameState
+from actors import ActorPool
+from direct_messages import DirectMessenger
+from equity import estimate_equity, MAX_BUDGET_MS
+from game import Game, GAME_OPTIONS, GameState, HAND_STATES
+from game_store import GameStore
+from hand_history import HistoryWriter
+from journal import Journal
+from outbox import LiveMessage, Outbox
+from poker import load_hand_table
+from stats import StatsStore
 
-POKER_BOT_TOKEN = 
+load_dotenv()
+POKER_BOT_TOKEN = os.getenv("DISCORD_TOKEN")
+# Where games in progress are saved when they're evicted from memory. If it's
+# not set, abandoned games are dropped instead
+GAME_SPILL_DIR = os.getenv("GAME_SPILL_DIR")
+# Where every game's actions are saved, so games survive the bot restarting.
+# If it's not set, games only live in memory
+GAME_JOURNAL_DIR = os.getenv("GAME_JOURNAL_DIR")
+# Where to write the history of every hand played, if anywhere
+HAND_HISTORY_DIR = os.getenv("HAND_HISTORY_DIR")
+# The SQLite database to keep every player's stats in, if anywhere
+PLAYER_STATS_DB = os.getenv("PLAYER_STATS_DB")
+
+# How many seconds between looking for idle tables to evict
+EVICT_INTERVAL = 60
 
 client = discord.Client()
-games: Dict[discord.TextChannel, Game] = {}
+# Saves the games' actions as they're taken, if there's somewhere to save them
+journal = Journal(GAME_JOURNAL_DIR) if GAME_JOURNAL_DIR else None
+# Writes the hand histories, if there's somewhere to write them
+histories = HistoryWriter(HAND_HISTORY_DIR) if HAND_HISTORY_DIR else None
+# Every player's stats, if there's somewhere to keep them
+player_stats = StatsStore(PLAYER_STATS_DB) if PLAYER_STATS_DB else None
+# The game in each channel, keyed by channel id. Games that are dropped from
+# memory don't need rebuilding after a restart either
+games = GameStore(GAME_SPILL_DIR,
+                  on_drop=journal.remove if journal is not None else None)
+# Stands in for the game in channels that don't have one, for the commands
+# that only need to say there's no game. It's never changed, so it's shared
+NO_GAME = Game()
+# The workers that run each channel's commands in order
+actors = ActorPool()
+# Merges and paces the messages sent to each channel
+outbox = Outbox()
+# The live message showing the table, for each channel playing in table view
+views: Dict[int, LiveMessage] = {}
+# The tasks running in the background, kept so they aren't garbage collected
+# before they finish
+background_tasks: Set[asyncio.Future] = set()
 
 # Starts a new game if one hasn't been started yet, returning an error message
 # if a game has already been started. Returns the messages the bot should say
 def new_game(game: Game, message: discord.Message) -> List[str]:
     if game.state == GameState.NO_GAME:
-        game.new_game()
-        game.add_player(message.author)
-        game.state = GameState.WAITING
+        game.open_game(message.author.id, message.author.display_name)
         return [f"A new game has been started by {message.author.display_name}!",
                 "Message !join to join the game."]
     else:
@@ -38,7 +84,7 @@ def join_game(game: Game, message: discord.Message) -> List[str]:
     elif game.state != GameState.WAITING:
         return [f"The game is already in progress, {message.author.display_name}.",
                 "You're not allowed to join right now."]
-    elif game.add_player(message.author):
+    elif game.add_player(message.author.id, message.author.display_name):
         return [f"{message.author.display_name} has joined the game!",
                 "Message !join to join the game, "
                 "or !start to start the game."]
@@ -53,7 +99,7 @@ def start_game(game: Game, message: discord.Message) -> List[str]:
     elif game.state != GameState.WAITING:
         return [f"The game has already started, {message.author.display_name}.",
                 "It can't be started twice."]
-    elif not game.is_player(message.author):
+    elif not game.is_player(message.author.id):
         return [f"You are not a part of that game yet, {message.author.display_name}.",
                 "Please message !join if you are interested in playing."]
     elif len(game.players) < 2:
@@ -73,9 +119,9 @@ def deal_hand(game: Game, message: discord.Message) -> List[str]:
         return ["You can't deal because the game hasn't started yet."]
     elif game.state != GameState.NO_HANDS:
         return ["The cards have already been dealt."]
-    elif game.dealer.user != message.author:
+    elif game.dealer.user_id != message.author.id:
         return [f"You aren't the dealer, {message.author.display_name}.",
-                f"Please wait for {game.dealer.user.display_name} to !deal."]
+                f"Please wait for {game.dealer.name} to !deal."]
     else:
         return game.deal_hands()
 
@@ -87,15 +133,15 @@ def call_bet(game: Game, message: discord.Message) -> List[str]:
         return ["No game has been started yet. Message !newgame to start one."]
     elif game.state == GameState.WAITING:
         return ["You can't call any bets because the game hasn't started yet."]
-    elif not game.is_player(message.author):
+    elif not game.is_player(message.author.id):
         return ["You can't call, because you're not playing, "
                 f"{message.author.display_name}."]
     elif game.state == GameState.NO_HANDS:
         return ["You can't call any bets because the hands haven't been "
                 "dealt yet."]
-    elif game.current_player.user != message.author:
+    elif game.current_player.user_id != message.author.id:
         return [f"You can't call {message.author.display_name}, because it's "
-                f"{game.current_player.user.display_name}'s turn."]
+                f"{game.current_player.name}'s turn."]
     else:
         return game.call()
 
@@ -107,15 +153,15 @@ def strip_bet(game: Game, message: discord.Message) -> List[str]:
         return ["No game has been started yet. Message !newgame to start one."]
     elif game.state == GameState.WAITING:
         return ["You can't strip because the game hasn't started yet."]
-    elif not game.is_player(message.author):
+    elif not game.is_player(message.author.id):
         return ["You can't strip, because you're not playing, "
                 f"{message.author.display_name}."]
     elif game.state == GameState.NO_HANDS:
         return ["You can't strip because the hands haven't been "
                 "dealt yet."]
-    elif game.current_player.user != message.author:
+    elif game.current_player.user_id != message.author.id:
         return [f"You can't strip {message.author.display_name}, because it's "
-                f"{game.current_player.user.display_name}'s turn."]
+                f"{game.current_player.name}'s turn."]
     else:
         return game.strip()
 
@@ -127,15 +173,15 @@ def bind_bet(game: Game, message: discord.Message) -> List[str]:
         return ["No game has been started yet. Message !newgame to start one."]
     elif game.state == GameState.WAITING:
         return ["You can't bind because the game hasn't started yet."]
-    elif not game.is_player(message.author):
+    elif not game.is_player(message.author.id):
         return ["You can't bind, because you're not playing, "
                 f"{message.author.display_name}."]
     elif game.state == GameState.NO_HANDS:
         return ["You can't bind because the hands haven't been "
                 "dealt yet."]
-    elif game.current_player.user != message.author:
+    elif game.current_player.user_id != message.author.id:
         return [f"You can't bind {message.author.display_name}, because it's "
-                f"{game.current_player.user.name}'s turn."]
+                f"{game.current_player.name}'s turn."]
     else:
         return game.bind()
 
@@ -146,14 +192,14 @@ def check(game: Game, message: discord.Message) -> List[str]:
         return ["No game has been started yet. Message !newgame to start one."]
     elif game.state == GameState.WAITING:
         return ["You can't check because the game hasn't started yet."]
-    elif not game.is_player(message.author):
+    elif not game.is_player(message.author.id):
         return ["You can't check, because you're not playing, "
                 f"{message.author.display_name}."]
     elif game.state == GameState.NO_HANDS:
         return ["You can't check because the hands haven't been dealt yet."]
-    elif game.current_player.user != message.author:
+    elif game.current_player.user_id != message.author.id:
         return [f"You can't check, {message.author.display_name}, because it's "
-                f"{game.current_player.user.display_name}'s turn."]
+                f"{game.current_player.name}'s turn."]
     elif game.current_player.cur_bet != game.cur_bet:
         return [f"You can't check, {message.author.display_name} because you need to "
                 f"put in ${game.cur_bet - game.current_player.cur_bet} to "
@@ -168,14 +214,14 @@ def raise_bet(game: Game, message: discord.Message) -> List[str]:
         return ["No game has been started yet. Message !newgame to start one."]
     elif game.state == GameState.WAITING:
         return ["You can't raise because the game hasn't started yet."]
-    elif not game.is_player(message.author):
+    elif not game.is_player(message.author.id):
         return ["You can't raise, because you're not playing, "
                 f"{message.author.display_name}."]
     elif game.state == GameState.NO_HANDS:
         return ["You can't raise because the hands haven't been dealt yet."]
-    elif game.current_player.user != message.author:
+    elif game.current_player.user_id != message.author.id:
         return [f"You can't raise, {message.author.display_name}, because it's "
-                f"{game.current_player.display_name}'s turn."]
+                f"{game.current_player.name}'s turn."]
 
     tokens = message.content.split()
     if len(tokens) < 2:
@@ -203,14 +249,14 @@ def fold_hand(game: Game, message: discord.Message) -> List[str]:
                 "Message !newgame to start one."]
     elif game.state == GameState.WAITING:
         return ["You can't fold yet because the game hasn't started yet."]
-    elif not game.is_player(message.author):
+    elif not game.is_player(message.author.id):
         return ["You can't fold, because you're not playing, "
                 f"{message.author.display_name}."]
     elif game.state == GameState.NO_HANDS:
         return ["You can't fold yet because the hands haven't been dealt yet."]
-    elif game.current_player.user != message.author:
+    elif game.current_player.user_id != message.author.id:
         return [f"You can't fold {message.author.display_name}, because it's "
-                f"{game.current_player.display_name}'s turn."]
+                f"{game.current_player.name}'s turn."]
     else:
         return game.fold()
 
@@ -255,8 +301,10 @@ def set_option(game: Game, message: discord.Message) -> List[str]:
         val = int(tokens[2])
         if val < 0:
             return [f"Cannot set {tokens[1]} to a negative value!"]
-        game.options[tokens[1]] = val
-        return [f"The {tokens[1]} is now set to {tokens[2]}."]
+        # Working out the odds ties up the whole pool of workers
+        if tokens[1] == "odds-time" and val > MAX_BUDGET_MS:
+            return [f"odds-time can't be set higher than {MAX_BUDGET_MS}."]
+        return game.set_option(tokens[1], val)
     except ValueError:
         return [f"{tokens[1]} must be set to an integer, and '{tokens[2]}'"
                 " is not a valid integer."]
@@ -267,7 +315,7 @@ def chip_count(game: Game, message: discord.Message) -> List[str]:
     if game.state in (GameState.NO_GAME, GameState.WAITING):
         return ["You can't request a chip count because the game "
                 "hasn't started yet."]
-    return [f"{player.user.display_name} has ${player.balance}."
+    return [f"{player.name} has ${player.balance}."
             for player in game.players]
 
 # Handles a player going all-in, returning an error message if the player
@@ -278,20 +326,64 @@ def all_in(game: Game, message: discord.Message) -> List[str]:
         return ["No game has been started yet. Message !newgame to start one."]
     elif game.state == GameState.WAITING:
         return ["You can't go all in because the game hasn't started yet."]
-    elif not game.is_player(message.author):
+    elif not game.is_player(message.author.id):
         return ["You can't go all in, because you're not playing, "
                 f"{message.author.display_name}."]
     elif game.state == GameState.NO_HANDS:
         return ["You can't go all in because the hands haven't "
                 "been dealt yet."]
-    elif game.current_player.user != message.author:
+    elif game.current_player.user_id != message.author.id:
         return [f"You can't go all in, {message.author.display_name}, because "
-                f"it's {game.current_player.user.display_name}'s turn."]
+                f"it's {game.current_player.name}'s turn."]
     else:
         return game.all_in()
 
+# Tells the player who asked their chances of winning the pot, with their own
+# hole cards against hands they can't see for everyone else still in it. Other
+# players' cards are never used, and the odds are sent by direct message so
+# they don't give the player's hand away. Returns the list of messages for the
+# bot to say.
+async def show_odds(game: Game, message: discord.Message) -> List[str]:
+    if game.state == GameState.NO_GAME:
+        return ["No game has been started yet. Message !newgame to start one."]
+    elif game.state in (GameState.WAITING, GameState.NO_HANDS):
+        return ["There are no odds to show because the hands haven't been "
+                "dealt yet."]
+    player = game.players_by_id.get(message.author.id)
+    if player is None or player not in game.pot.in_pot():
+        return [f"You aren't in this hand, {message.author.display_name}."]
+
+    opponents = len(game.pot.in_pot()) - 1
+    [(win, tie)] = await estimate_equity(list(game.shared_cards),
+                                         [player.cards],
+                                         game.options["odds-time"], opponents)
+    hands = "hand" if opponents == 1 else "hands"
+    sent = await get_messenger().send(player.user_id,
+                                      f"Your hand has a {win:.1%} chance to "
+                                      f"win and a {tie:.1%} chance to tie "
+                                      f"against {opponents} unknown {hands}.")
+    if not sent:
+        return [f"I couldn't send {player.name} their odds. Please make sure "
+                "you accept direct messages from server members."]
+    return [f"I've sent {player.name} their odds."]
+
+# Shows the stats of the mentioned player, or of whoever asked. They're looked
+# up in memory, so this never waits on the database
+def show_stats(game: Game, message: discord.Message) -> List[str]:
+    if player_stats is None:
+        return ["Stats aren't being kept."]
+    user = message.mentions[0] if message.mentions else message.author
+    stats = player_stats.get(user.id)
+    if stats is None:
+        return [f"{user.display_name} hasn't played a hand yet."]
+    return [str(stats)]
+
 Command = namedtuple("Command", ["description", "action"])
 
+# The commands that need a channel to have a game, so one is created for them.
+# Every other command is fine with a channel that doesn't have a game
+CREATES_GAME = {'!newgame', '!set'}
+
 # The commands avaliable to the players
 commands: Dict[str, Command] = {
     '!newgame': Command('Starts a new game, allowing players to join.',
@@ -324,10 +416,150 @@ commands: Dict[str, Command] = {
                         chip_count),
     '!all-in':  Command('Bets the entirety of your remaining chips',
                         all_in),
+    '!odds':    Command('Sends you the chances of your hand winning the pot',
+                        show_odds),
+    '!stats':   Command('Shows the stats of a player, or your own',
+                        show_stats),
 }
 
+# Returns the discord user with the given id, from the client's cache if it's
+# there, and otherwise by asking discord
+async def get_user(user_id: int) -> discord.User:
+    user = client.get_user(user_id)
+    if user is None:
+        user = await client.fetch_user(user_id)
+    return user
+
+# Sends direct messages to the players. It's created the first time it's
+# needed, once the event loop is running
+messenger: Optional[DirectMessenger] = None
+
+def get_messenger() -> DirectMessenger:
+    global messenger
+    if messenger is None:
+        messenger = DirectMessenger(get_user)
+    return messenger
+
+# Runs a coroutine in the background, printing its error if it fails
+def run_in_background(coroutine: Awaitable[None]) -> None:
+    task = asyncio.ensure_future(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(finish_background_task)
+
+def finish_background_task(task: asyncio.Future) -> None:
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        error = task.exception()
+        traceback.print_exception(type(error), error, error.__traceback__)
+
+# Sends each player a direct message telling them what their hole cards are,
+# all at once, and tells the channel about anyone who couldn't be reached
+async def tell_hands(game: Game, channel: discord.TextChannel) -> None:
+    names = {player.user_id: player.name for player in game.players}
+    failed = await get_messenger().send_all(game.hand_messages())
+    if failed:
+        outbox.post(channel.id, "I couldn't send "
+                    + ", ".join(names[user_id] for user_id in failed)
+                    + " their hand. Please make sure you accept direct "
+                    "messages from server members, and ask the table to wait.",
+                    channel.send)
+
+# Shows the moves made during a hand in the channel's table view, editing the
+# one message rather than sending a new one. Returns whether the messages were
+# shown, and so don't need sending. Anything else, like errors and the results
+# of the hand, is still sent as a new message
+def show_in_view(game: Game, channel: discord.TextChannel,
+                 messages: List[str], actions_before: int) -> bool:
+    if not game.options["table-view"]:
+        views.pop(channel.id, None)
+        return False
+    if game.actions_taken == actions_before:
+        return False
+    view = views.get(channel.id)
+    if game.state in HAND_STATES:
+        if view is None:
+            # The view's first message is paced with the channel's replies
+            view = LiveMessage(lambda text: outbox.send_now(channel.id, text,
+                                                            channel.send))
+            views[channel.id] = view
+        view.update(game.table_view() + "\n\n" + "\n".join(messages))
+        return True
+    # The hand is over, so leave the view showing the final stacks, and start
+    # a new one next hand
+    if view is not None:
+        view.update(game.table_view())
+        del views[channel.id]
+    return False
+
+# Sets a game up to be saved, and to keep whatever the bot has somewhere to
+# write
+def track_game(game: Game) -> None:
+    game.recording = journal is not None
+    game.keep_histories = histories is not None
+    game.keep_stats = player_stats is not None
+
+# Runs a command against the game in the message's channel, and tells the
+# channel what happened
+async def run_command(command: str, message: discord.Message) -> None:
+    if command in CREATES_GAME:
+        game = games.get_or_create(message.channel.id)
+        track_game(game)
+    else:
+        game = games.get(message.channel.id) or NO_GAME
+    actions = game.actions_taken
+    messages = commands[command][1](game, message)
+    # Some commands need to wait on other work, like !odds, so let them
+    # finish without blocking the other channels
+    if asyncio.iscoroutine(messages):
+        messages = await messages
+
+    # Take the finished hands before the game is saved, so they're only ever
+    # handed over once
+    finished_hands, game.finished_hands = game.finished_hands, []
+    finished_stats, game.finished_stats = game.finished_stats, []
+
+    # Only tell the table about actions once they've been saved, so nothing
+    # the players have seen can be lost in a crash
+    if journal is not None and game.action_log:
+        journal.record(message.channel.id, game)
+        await journal.flush()
+    # Histories are written on their own thread, so this doesn't wait
+    if histories is not None:
+        for history in finished_hands:
+            histories.submit(message.channel.name, history)
+    # Stats are updated in memory, and written later in batches
+    if player_stats is not None:
+        for rows in finished_stats:
+            player_stats.add(rows)
+
+    # Replies sent close together are merged into one message, which keeps
+    # busy tables under discord's rate limit
+    if not show_in_view(game, message.channel, messages, actions):
+        outbox.post(message.channel.id, '\n'.join(messages),
+                    message.channel.send)
+
+    # The messages to send to the channel and the messages to send to the
+    # players individually must be done seperately, so we check the messages
+    # to the channel to see if hands were just dealt, and if so, we tell the
+    # players what their hands are. The table doesn't need to wait on the
+    # direct messages, so they're sent in the background
+    if command == '!deal' and messages[0] == 'The hands have been dealt!':
+        run_in_background(tell_hands(game, message.channel))
+
+# Evicts idle tables every so often, for as long as the bot runs
+async def evict_idle_games() -> None:
+    while True:
+        await asyncio.sleep(EVICT_INTERVAL)
+        games.evict_idle()
+
+evictor = None
+
 @client.event
 async def on_ready():
+    global evictor
+    # on_ready is called again after reconnecting, so only start one evictor
+    if evictor is None:
+        evictor = asyncio.ensure_future(evict_idle_games())
     print("Poker bot ready!")
 
 @client.event
@@ -354,20 +586,42 @@ async def on_message(message):
     command = message.content.split()[0]
     if command[0] == '!':
         if command not in commands:
-            await message.channel.send(f"{message.content} is not a valid command. "
-                                        "Message !help to see the list of commands.")
+            outbox.post(message.channel.id,
+                        f"{message.content} is not a valid command. "
+                        "Message !help to see the list of commands.",
+                        message.channel.send)
             return
 
-        game = games.setdefault(message.channel, Game())
-        messages = commands[command][1](game, message)
+        # Commands for a table are run one at a time, in the order they were
+        # sent, so a command that awaits can't have another command change
+        # the game halfway through it. Other tables carry on in the meantime
+        actors.submit(message.channel.id,
+                      lambda: run_command(command, message))
 
-        # The messages to send to the channel and the messages to send to the
-        # players individually must be done seperately, so we check the messages
-        # to the channel to see if hands were just dealt, and if so, we tell the
-        # players what their hands are.
-        if command == '!deal' and messages[0] == 'The hands have been dealt!':
-            await game.tell_hands()
-
-        await message.channel.send('\n'.join(messages))
-
-client.run(POKER_BOT_TOKEN)
\ No newline at end of file
+# The odds calculations run in worker processes, which may import this module,
+# so only start the bot when it's run directly
+if __name__ == "__main__":
+    # Load the hand evaluator's table now, building it if this is a fresh
+    # install, rather than stalling every channel on the first deal
+    load_hand_table()
+    # Rebuild the games that were running when the bot last stopped
+    if journal is not None:
+        start = time.perf_counter()
+        recovered = journal.recover()
+        # Every recovered game is still wanted, and evicting one here could
+        # delete its journal, so none are evicted until the bot is running
+        for channel_id, game in recovered.items():
+            track_game(game)
+            games.add(channel_id, game, make_room=False)
+        print(f"Recovered {len(recovered)} tables in "
+              f"{time.perf_counter() - start:.2f}s")
+    try:
+        client.run(POKER_BOT_TOKEN)
+    finally:
+        # Write the hands still queued, and finish the current file, which
+        # can't be read without its gzip trailer
+        if histories is not None:
+            histories.close()
+        # Write the stats still queued
+        if player_stats is not None:
+            player_stats.close()
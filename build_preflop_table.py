@@ -0,0 +1,129 @@
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations, permutations
+from typing import Dict, List, Optional, Tuple
+import argparse
+import os
+import time
+
+import numpy as np
+
+from poker import (PREFLOP_TABLE_MAGIC, PREFLOP_TABLE_PATH, STARTING_HANDS,
+                   rank_many)
+
+# A pair of hole cards, as card indices
+HoleIndices = Tuple[int, int]
+
+# Returns every pair of hole cards that belongs to a kind of starting hand
+def class_hands(hand_class: int) -> List[HoleIndices]:
+    row, column = divmod(hand_class, 13)
+    if row == column:
+        return [(suit1 * 13 + row, suit2 * 13 + row)
+                for suit1, suit2 in combinations(range(4), 2)]
+    if row < column:
+        return [(suit * 13 + row, suit * 13 + column) for suit in range(4)]
+    return [(suit1 * 13 + row, suit2 * 13 + column)
+            for suit1 in range(4) for suit2 in range(4) if suit1 != suit2]
+
+# Returns the same matchup with its suits renamed so that matchups that only
+# differ by which suit is which come out the same
+def canonical_matchup(hand: HoleIndices, other: HoleIndices
+                      ) -> Tuple[HoleIndices, HoleIndices]:
+    best = None
+    for suits in permutations(range(4)):
+        renamed = tuple(tuple(sorted(suits[card // 13] * 13 + card % 13
+                                     for card in cards))
+                        for cards in (hand, other))
+        if best is None or renamed < best:
+            best = renamed
+    return best
+
+# Returns the distinct matchups between two kinds of starting hands, up to
+# renaming suits, along with how many actual matchups each one stands for
+def class_matchups(hand_class: int, other_class: int
+                   ) -> Dict[Tuple[HoleIndices, HoleIndices], int]:
+    matchups: Dict[Tuple[HoleIndices, HoleIndices], int] = Counter()
+    for hand in class_hands(hand_class):
+        for other in class_hands(other_class):
+            if not set(hand) & set(other):
+                matchups[canonical_matchup(hand, other)] += 1
+    return matchups
+
+every_board: Optional[np.ndarray] = None
+
+# Returns every way to pick five cards out of the 48 left after the hole cards
+# are dealt, as positions in the remaining deck. Each worker builds this once
+def all_boards() -> np.ndarray:
+    global every_board
+    if every_board is None:
+        every_board = np.array(list(combinations(range(48), 5)), dtype=np.int8)
+    return every_board
+
+# Works out the chances of one kind of starting hand winning and tying against
+# another. Every board is checked, unless a number of boards to sample is given
+def class_equity(hand_class: int, other_class: int, boards: Optional[int]
+                 ) -> Tuple[int, int, float, float]:
+    rng = np.random.default_rng()
+    total = wins = ties = 0
+    for (hand, other), weight in class_matchups(hand_class, other_class).items():
+        deck = np.array([card for card in range(52)
+                         if card not in hand and card not in other])
+        if boards is None:
+            board_cards = deck[all_boards()]
+        else:
+            board_cards = np.argsort(rng.random((boards, len(deck))),
+                                     axis=1)[:, :5]
+            board_cards = deck[board_cards]
+        scores = rank_many(board_cards, np.tile(hand, (len(board_cards), 1)))
+        other_scores = rank_many(board_cards,
+                                 np.tile(other, (len(board_cards), 1)))
+        total += weight * len(board_cards)
+        wins += weight * int(np.count_nonzero(scores > other_scores))
+        ties += weight * int(np.count_nonzero(scores == other_scores))
+    return hand_class, other_class, wins / total, ties / total
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Builds the heads-up preflop equity table for poker.py")
+    parser.add_argument("--boards", type=int, default=None,
+                        help="sample this many boards for each matchup "
+                             "instead of checking every board")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="how many processes to use (default: all cores)")
+    parser.add_argument("--output", default=PREFLOP_TABLE_PATH,
+                        help="where to write the table")
+    args = parser.parse_args()
+
+    # The second hand's chances follow from the first's, so only half the
+    # table needs to be worked out
+    pairs = [(hand_class, other_class)
+             for hand_class in range(STARTING_HANDS)
+             for other_class in range(hand_class, STARTING_HANDS)]
+
+    table = array('H', PREFLOP_TABLE_MAGIC)
+    table.extend([0] * (2 * STARTING_HANDS * STARTING_HANDS))
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        jobs = executor.map(class_equity, *zip(*pairs),
+                            [args.boards] * len(pairs))
+        for done, (hand_class, other_class, win, tie) in enumerate(jobs, 1):
+            lose = max(0.0, 1 - win - tie)
+            position = 2 + 2 * (hand_class * STARTING_HANDS + other_class)
+            table[position] = round(win * 0xFFFF)
+            table[position + 1] = round(tie * 0xFFFF)
+            position = 2 + 2 * (other_class * STARTING_HANDS + hand_class)
+            table[position] = round(lose * 0xFFFF)
+            table[position + 1] = round(tie * 0xFFFF)
+            if done % 100 == 0 or done == len(pairs):
+                print(f"{done}/{len(pairs)} matchups done after "
+                      f"{time.perf_counter() - start:.0f}s")
+
+    temp_path = f"{args.output}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as table_file:
+        table.tofile(table_file)
+    os.replace(temp_path, args.output)
+    print(f"Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
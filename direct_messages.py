@@ -0,0 +1,74 @@
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
+import time
+
+import discord
+
+# How many direct messages can be in flight at once
+MAX_CONCURRENT = 5
+
+# How many times to try sending a message before giving up on it
+ATTEMPTS = 3
+
+# How many seconds to wait before retrying a failed send, doubled each time,
+# when discord doesn't say how long to wait
+RETRY_DELAY = 1.0
+
+# Sends direct messages to many users at once, while keeping to discord's rate
+# limits. Each user's DM channel is its own rate limit route, so when discord
+# says a route is limited, only sends to that user wait, unless the limit is
+# global
+class DirectMessenger:
+    def __init__(self, get_user: Callable[[int], Awaitable[discord.User]],
+                 max_concurrent: int = MAX_CONCURRENT) -> None:
+        self.get_user = get_user
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        # When each route can be used again, by user id, after being rate
+        # limited. The None key holds the global rate limit
+        self.limited_until: Dict[Optional[int], float] = {}
+
+    # Waits until neither the user's route nor the global limit is in effect
+    async def wait_for_route(self, user_id: int) -> None:
+        while True:
+            until = max(self.limited_until.get(user_id, 0),
+                        self.limited_until.get(None, 0))
+            delay = until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    # Sends one direct message, retrying if discord fails or rate limits us.
+    # Returns whether the message was sent
+    async def send(self, user_id: int, text: str) -> bool:
+        delay = RETRY_DELAY
+        for attempt in range(ATTEMPTS):
+            await self.wait_for_route(user_id)
+            try:
+                async with self.semaphore:
+                    user = await self.get_user(user_id)
+                    await user.send(text)
+                return True
+            except discord.Forbidden:
+                # The user doesn't accept DMs from us, so retrying won't help
+                return False
+            except (discord.HTTPException, asyncio.TimeoutError) as error:
+                if attempt == ATTEMPTS - 1:
+                    return False
+                retry_after = delay
+                if isinstance(error, discord.HTTPException) and error.status == 429:
+                    headers = error.response.headers
+                    retry_after = float(headers.get("Retry-After", delay))
+                    route = None if headers.get("X-RateLimit-Global") else user_id
+                    self.limited_until[route] = time.monotonic() + retry_after
+                else:
+                    await asyncio.sleep(retry_after)
+                delay *= 2
+        return False
+
+    # Sends a direct message to each user at the same time. Returns the ids of
+    # the users whose messages couldn't be sent
+    async def send_all(self, messages: Dict[int, str]) -> List[int]:
+        user_ids = list(messages)
+        sent = await asyncio.gather(*(self.send(user_id, messages[user_id])
+                                      for user_id in user_ids))
+        return [user_id for user_id, ok in zip(user_ids, sent) if not ok]
@@ -0,0 +1,66 @@
+import os
+
+# How many bytes of entropy to read from the operating system at once
+POOL_SIZE = 1 << 16
+
+# How many different values a word from the pool can take
+WORD_RANGE = 1 << 32
+
+# A cryptographically secure source of random numbers, which reads entropy
+# from os.urandom in bulk and hands it out as 32-bit words, rather than making
+# a system call for every number. It isn't thread safe, so each thread should
+# have its own pool
+class EntropyPool:
+    def __init__(self, size: int = POOL_SIZE) -> None:
+        self.size = size
+        self.words: memoryview = memoryview(b"").cast("I")
+        self.position = 0
+        # The process that read the pool's entropy. A forked child would
+        # otherwise deal the same cards as its parent
+        self.pid = -1
+
+    def refill(self) -> None:
+        self.words = memoryview(os.urandom(self.size)).cast("I")
+        self.position = 0
+        self.pid = os.getpid()
+
+    # Returns a random integer from 0 up to but not including n, which must be
+    # at most 2 ** 32. Words that would make some values more likely than
+    # others are thrown away and redrawn, rather than taken modulo n
+    def below(self, n: int) -> int:
+        if self.pid != os.getpid():
+            self.refill()
+        limit = WORD_RANGE - WORD_RANGE % n
+        while True:
+            if self.position == len(self.words):
+                self.refill()
+            word = self.words[self.position]
+            self.position += 1
+            if word < limit:
+                return word % n
+
+    # Shuffles a list in place with a Fisher-Yates shuffle. This is below()
+    # inlined into the loop, since a deck needs a number for every card
+    def shuffle(self, items: list) -> None:
+        if self.pid != os.getpid():
+            self.refill()
+        words = self.words
+        position = self.position
+        for i in range(len(items) - 1, 0, -1):
+            n = i + 1
+            limit = WORD_RANGE - WORD_RANGE % n
+            while True:
+                if position == len(words):
+                    self.refill()
+                    words = self.words
+                    position = 0
+                word = words[position]
+                position += 1
+                if word < limit:
+                    break
+            j = word % n
+            items[i], items[j] = items[j], items[i]
+        self.position = position
+
+# The pool shared by everything in the process that needs secure numbers
+pool = EntropyPool()
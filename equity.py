@@ -0,0 +1,144 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from typing import List, Optional, Tuple
+import asyncio
+import os
+import random
+import time
+
+from poker import (best_possible_hand, Card, CARDS, Hand, load_preflop_table,
+                   preflop_equity)
+
+# The chances a player has of winning the pot outright, and of splitting it
+Equity = Tuple[float, float]
+
+# If there are at most this many ways to finish the board, every one of them is
+# checked instead of sampling them
+EXHAUSTIVE_LIMIT = 5000
+
+# The most milliseconds an estimate can take, since it keeps every worker busy
+# for that long, whichever table asked
+MAX_BUDGET_MS = 2000
+
+# How many boards a worker checks between looking at the clock
+CLOCK_INTERVAL = 64
+
+# How many processes the equity calculations are spread across, one per core
+WORKERS = os.cpu_count() or 1
+
+# The pool of processes that the equity calculations are run in. It's created
+# the first time it's needed
+executor: Optional[ProcessPoolExecutor] = None
+
+def get_executor() -> ProcessPoolExecutor:
+    global executor
+    if executor is None:
+        executor = ProcessPoolExecutor(max_workers=WORKERS)
+    return executor
+
+# Returns how many ways there are to choose k cards out of n
+def choose(n: int, k: int) -> int:
+    ways = 1
+    for i in range(k):
+        ways = ways * (n - i) // (i + 1)
+    return ways
+
+# Returns the cards left in the deck once the given cards are taken out
+def remaining_cards(known: List[Card]) -> List[Card]:
+    known_indices = {card.index for card in known}
+    return [card for card in CARDS if card.index not in known_indices]
+
+# Adds the result of one board to the win and tie counts of each hand
+def count_board(board: List[Card], hands: List[Tuple[Card, Card]],
+                wins: List[int], ties: List[int]) -> None:
+    best_hands = [best_possible_hand(board, hand) for hand in hands]
+    best: Hand = max(best_hands)
+    winners = [i for i, hand in enumerate(best_hands) if hand == best]
+    if len(winners) == 1:
+        wins[winners[0]] += 1
+    else:
+        for i in winners:
+            ties[i] += 1
+
+# Checks every possible way to finish the board. Returns the number of boards
+# checked, and the number of boards each hand won and tied
+def enumerate_boards(shared: List[Card], hands: List[Tuple[Card, Card]]
+                     ) -> Tuple[int, List[int], List[int]]:
+    wins = [0] * len(hands)
+    ties = [0] * len(hands)
+    boards = 0
+    deck = remaining_cards(shared + [card for hand in hands for card in hand])
+    for rest in combinations(deck, 5 - len(shared)):
+        count_board(shared + list(rest), hands, wins, ties)
+        boards += 1
+    return boards, wins, ties
+
+# Checks random ways to finish the board until the time budget runs out, with
+# random hole cards dealt to the given number of unknown hands as well. Returns
+# the number of boards checked, and the number of boards each of the given
+# hands won and tied
+def sample_boards(shared: List[Card], hands: List[Tuple[Card, Card]],
+                  budget_ms: int, unknown: int = 0
+                  ) -> Tuple[int, List[int], List[int]]:
+    deadline = time.perf_counter() + budget_ms / 1000
+    # Each worker needs its own random stream, or forked workers would all
+    # draw the same boards
+    rng = random.Random()
+    wins = [0] * (len(hands) + unknown)
+    ties = [0] * (len(hands) + unknown)
+    boards = 0
+    deck = remaining_cards(shared + [card for hand in hands for card in hand])
+    needed = 5 - len(shared)
+    while True:
+        for _ in range(CLOCK_INTERVAL):
+            drawn = rng.sample(deck, needed + 2 * unknown)
+            others = [(drawn[i], drawn[i + 1])
+                      for i in range(needed, len(drawn), 2)]
+            count_board(shared + drawn[:needed], hands + others, wins, ties)
+        boards += CLOCK_INTERVAL
+        if time.perf_counter() >= deadline:
+            break
+    return boards, wins[:len(hands)], ties[:len(hands)]
+
+# Works out the chances of each hand winning or tying, given the shared cards
+# dealt so far, against each other and against the given number of hands
+# whose cards aren't known, spending about budget_ms milliseconds on it. This
+# runs in the process pool, so it doesn't block the event loop
+async def estimate_equity(shared: List[Card], hands: List[Tuple[Card, Card]],
+                          budget_ms: int, unknown: int = 0) -> List[Equity]:
+    # Heads-up before the flop, the odds can be looked up if the preflop
+    # table has been built
+    if len(shared) == 0 and len(hands) == 2 and unknown == 0:
+        equity = preflop_equity(hands[0], hands[1])
+        if equity is not None:
+            return [equity, preflop_equity(hands[1], hands[0])]
+    # Against one unknown hand, it's the average of the odds against every
+    # hand the opponent could hold
+    if len(shared) == 0 and len(hands) == 1 and unknown == 1 \
+            and load_preflop_table() is not None:
+        others = list(combinations(remaining_cards(list(hands[0])), 2))
+        odds = [preflop_equity(hands[0], other) for other in others]
+        return [(sum(win for win, _ in odds) / len(odds),
+                 sum(tie for _, tie in odds) / len(odds))]
+
+    budget_ms = min(budget_ms, MAX_BUDGET_MS)
+    loop = asyncio.get_event_loop()
+    pool = get_executor()
+    deck_size = 52 - len(shared) - 2 * len(hands)
+    if unknown == 0 and choose(deck_size, 5 - len(shared)) <= EXHAUSTIVE_LIMIT:
+        jobs = [loop.run_in_executor(pool, enumerate_boards, shared, hands)]
+    else:
+        jobs = [loop.run_in_executor(pool, sample_boards, shared, hands,
+                                     budget_ms, unknown)
+                for _ in range(WORKERS)]
+
+    total_boards = 0
+    wins = [0] * len(hands)
+    ties = [0] * len(hands)
+    for boards, job_wins, job_ties in await asyncio.gather(*jobs):
+        total_boards += boards
+        for i in range(len(hands)):
+            wins[i] += job_wins[i]
+            ties[i] += job_ties[i]
+    return [(wins[i] / total_boards, ties[i] / total_boards)
+            for i in range(len(hands))]
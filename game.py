@@ -1,13 +1,15 @@
 from collections import namedtuple
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import Dict, List
-
-import discord
+from typing import Any, Callable, Dict, List, Optional, Set
+import functools
+import random
 
 from player import Player
-from poker import best_possible_hand, Card, Deck
-from pot import PotManager
+from poker import Card, Deck, HandState
+from hand_history import HandHistory
+from pot import PotManager, Showdown, total_awards
+from stats import HandRow, HandStats
 
 Option = namedtuple("Option", ["description", "default"])
 
@@ -15,7 +17,13 @@ GAME_OPTIONS: Dict[str, Option] = {
     "blind":  Option("The current price of the small blind", 5),
     "buy-in": Option("The amount of money all players start out with", 250),
     "raise-delay": Option("The number of minutes before blinds double",  30),
-    "starting-blind": Option("The starting price of the small blind", 5)
+    "starting-blind": Option("The starting price of the small blind", 5),
+    "odds-time": Option("The number of milliseconds spent working out !odds, "
+                        "up to 2000", 500),
+    "table-view": Option("Set to 1 to show the table in one message that's "
+                         "kept up to date, instead of after every move", 0),
+    "secure-shuffle": Option("Set to 1 to shuffle with a cryptographically "
+                             "secure generator", 0),
 }
 
 # An enumeration that says what stage of the game we've reached
@@ -35,9 +43,57 @@ class GameState(Enum):
     # We just dealt the river
     RIVER_DEALT = 7
 
+# The states where a hand is being played
+HAND_STATES = (GameState.HANDS_DEALT, GameState.FLOP_DEALT,
+               GameState.TURN_DEALT, GameState.RIVER_DEALT)
+
+# The names of the game's actions, which can be replayed from an action log
+ACTIONS: Set[str] = set()
+
+# Marks a method as an action, which changes the game. Each action taken from
+# outside the game is counted, and written to the action log if the game is
+# recording, so the game can be rebuilt by replaying its actions. Actions taken
+# by other actions, like all_in calling call, are part of the outer action
+def action(method: Callable) -> Callable:
+    ACTIONS.add(method.__name__)
+
+    @functools.wraps(method)
+    def take_action(self: 'Game', *args) -> Any:
+        if self.in_action:
+            return method(self, *args)
+        self.in_action = True
+        try:
+            return method(self, *args)
+        finally:
+            # An action that fails partway has still changed the game, and
+            # replaying it fails at the same point, so it's logged either way
+            self.in_action = False
+            self.actions_taken += 1
+            if self.recording:
+                self.action_log.append([self.actions_taken, method.__name__]
+                                       + list(args))
+    return take_action
+
 # A class that keeps track of all the information having to do with a game
 class Game:
     def __init__(self) -> None:
+        # How many actions have been taken on the game
+        self.actions_taken = 0
+        # Whether an action is being taken right now
+        self.in_action = False
+        # Whether to write down the actions taken, in action_log
+        self.recording = False
+        # The actions taken that haven't been saved yet, each as a list of the
+        # action's number, its name and its arguments
+        self.action_log: List[list] = []
+        # Whether to keep a history of each hand, and the histories of the
+        # hands finished since they were last taken
+        self.keep_histories = False
+        self.finished_hands: List[HandHistory] = []
+        # Whether to keep each player's stats for each hand, and the stats of
+        # the hands finished since they were last taken
+        self.keep_stats = False
+        self.finished_stats: List[List[HandRow]] = []
         self.new_game()
         # Set the game options to the defaults
         self.options = {key: value.default
@@ -47,14 +103,25 @@ class Game:
         self.state = GameState.NO_GAME
         # The players participating in the game
         self.players: List[Player] = []
+        # The players participating in the game, keyed by user id
+        self.players_by_id: Dict[int, Player] = {}
         # The players participating in the current hand
         self.in_hand: List[Player] = []
+        # The index of each player in in_hand, keyed by user id
+        self.hand_index: Dict[int, int] = {}
         # The index of the current dealer
         self.dealer_index = 0
         # The index of the first person to bet in the post-flop rounds
         self.first_bettor = 0
         # The deck that we're dealing from
         self.cur_deck: Deck = None
+        # The seed the current hand's deck was shuffled with, or None if it
+        # was shuffled securely
+        self.hand_seed: Optional[int] = None
+        # The history of the current hand, if histories are being kept
+        self.history: Optional[HandHistory] = None
+        # The players' stats for the current hand, if stats are being kept
+        self.hand_stats: Optional[HandStats] = None
         # The five cards shared by all players
         self.shared_cards: List[Card] = []
         # Used to keep track of the current value of the pot, and who's in it
@@ -64,32 +131,66 @@ class Game:
         # The last time that the blinds were automatically raised
         self.last_raise: datetime = None
 
+    # Starts a new game that players can join, with the user who started it as
+    # the first player
+    @action
+    def open_game(self, user_id: int, name: str) -> List[str]:
+        self.new_game()
+        self.add_player(user_id, name)
+        self.state = GameState.WAITING
+        return []
+
+    # Sets an option to a new value, returning the messages to tell the channel
+    @action
+    def set_option(self, option: str, value: int) -> List[str]:
+        self.options[option] = value
+        return [f"The {option} is now set to {value}."]
+
+    # The hands finished since they were last taken have already been handed
+    # over, or will be, so they aren't saved with the game
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["finished_hands"] = []
+        state["finished_stats"] = []
+        return state
+
+    # Replays an action from an action log
+    def replay(self, entry: list) -> List[str]:
+        name = entry[1]
+        if name not in ACTIONS:
+            raise ValueError(f"'{name}' is not an action")
+        return getattr(self, name)(*entry[2:])
+
     # Adds a new player to the game, returning if they weren't already playing
-    def add_player(self, user: discord.User) -> bool:
-        if self.is_player(user):
+    @action
+    def add_player(self, user_id: int, name: str) -> bool:
+        if self.is_player(user_id):
             return False
-        self.players.append(Player(user))
+        player = Player(user_id, name)
+        self.players.append(player)
+        self.players_by_id[user_id] = player
         return True
 
     # Returns whether a user is playing in the game
-    def is_player(self, user: discord.User) -> bool:
-        for player in self.players:
-            if player.user == user:
-                return True
-        return False
+    def is_player(self, user_id: int) -> bool:
+        return user_id in self.players_by_id
+
+    # Returns the player for a user, or None if they aren't playing
+    def get_player(self, user_id: int) -> Optional[Player]:
+        return self.players_by_id.get(user_id)
 
     # Removes a player from being able to bet, if they folded or went all in
     def leave_hand(self, to_remove: Player) -> None:
-        for i, player in enumerate(self.in_hand):
-            if player == to_remove:
-                index = i
-                break
-        else:
+        index = self.hand_index.pop(to_remove.user_id, None)
+        if index is None:
             # The player who we're removing isn't in the hand, so just
             # return
             return
 
         self.in_hand.pop(index)
+        # Everyone after the player moves down a seat
+        for i in range(index, len(self.in_hand)):
+            self.hand_index[self.in_hand[i].user_id] = i
 
         # Adjust the index of the first person to bet and the index of the
         # current player, depending on the index of the player who just folded
@@ -104,8 +205,8 @@ class Game:
     def status_between_rounds(self) -> List[str]:
         messages = []
         for player in self.players:
-            messages.append(f"{player.user.display_name} has ${player.balance}.")
-        messages.append(f"{self.dealer.user.display_name} is the current dealer. "
+            messages.append(f"{player.name} has ${player.balance}.")
+        messages.append(f"{self.dealer.name} is the current dealer. "
                         "Message !deal to deal when you're ready.")
         return messages
 
@@ -128,6 +229,7 @@ class Game:
         return self.in_hand[self.turn_index]
 
     # Starts a new game, returning the messages to tell the channel
+    @action
     def start(self) -> List[str]:
         self.state = GameState.NO_HANDS
         self.dealer_index = 0
@@ -137,11 +239,28 @@ class Game:
         self.options["blind"] = self.options["starting-blind"]
         return ["The game has begun!"] + self.status_between_rounds()
 
-    # Starts a new round of Hold'em, dealing two cards to each player, and
-    # return the messages to tell the channel
+    # Starts a new round of Hold'em with a freshly shuffled deck, returning the
+    # messages to tell the channel
     def deal_hands(self) -> List[str]:
-        # Shuffles a new deck of cards
-        self.cur_deck = Deck()
+        timestamp = datetime.now().timestamp()
+        if self.options["secure-shuffle"]:
+            # A secure shuffle can't be repeated from a seed, so the order it
+            # left the deck in is logged instead
+            deck = Deck(secure=True)
+            return self.deal(None, timestamp,
+                             [card.index for card in deck.cards])
+        return self.deal(random.getrandbits(64), timestamp)
+
+    # Starts a new round of Hold'em, dealing two cards to each player from a
+    # deck shuffled with the given seed, or stacked in the given order of card
+    # indexes, and returns the messages to tell the channel. The deck and the
+    # time are passed in, rather than worked out here, so the hand can be
+    # replayed exactly
+    @action
+    def deal(self, seed: Optional[int], timestamp: float,
+             order: Optional[List[int]] = None) -> List[str]:
+        self.hand_seed = seed
+        self.cur_deck = Deck(seed) if order is None else Deck.stacked(order)
 
         # Start out the shared cards as being empty
         self.shared_cards = []
@@ -149,26 +268,40 @@ class Game:
         # Deals hands to each player, setting their initial bets to zero and
         # adding them as being in on the hand
         self.in_hand = []
+        self.hand_index = {}
         for player in self.players:
             player.cards = (self.cur_deck.draw(), self.cur_deck.draw())
+            player.hand_state = HandState(player.cards)
             player.cur_bet = 0
             player.placed_bet = False
+            self.hand_index[player.user_id] = len(self.in_hand)
             self.in_hand.append(player)
 
         self.state = GameState.HANDS_DEALT
         messages = ["The hands have been dealt!"]
 
+        if self.keep_histories:
+            self.history = HandHistory(int(timestamp * 1000000),
+                                       datetime.fromtimestamp(timestamp),
+                                       self.options["blind"],
+                                       [(player.name, player.balance)
+                                        for player in self.players],
+                                       self.dealer_index)
+        if self.keep_stats:
+            self.hand_stats = HandStats(self.players)
+
         # Reset the pot for the new hand
         self.pot.new_hand(self.players)
 
         if self.options["blind"] > 0:
-            messages += self.pay_blinds()
+            messages += self.pay_blinds(datetime.fromtimestamp(timestamp))
 
         self.turn_index -= 1
         return messages + self.next_turn()
 
-    # Makes the blinds players pay up with their initial bets
-    def pay_blinds(self) -> List[str]:
+    # Makes the blinds players pay up with their initial bets, at the given
+    # time
+    def pay_blinds(self, now: datetime) -> List[str]:
         messages: List[str] = []
 
         # See if we need to raise the blinds or not
@@ -179,13 +312,15 @@ class Game:
             self.last_raise = None
         elif self.last_raise is None:
             # Start the timer, if it hasn't been started yet
-            self.last_raise = datetime.now()
-        elif datetime.now() - self.last_raise > timedelta(minutes=raise_delay):
+            self.last_raise = now
+        elif now - self.last_raise > timedelta(minutes=raise_delay):
             messages.append("**Blinds are being doubled this round!**")
             self.options["blind"] *= 2
-            self.last_raise = datetime.now()
+            self.last_raise = now
 
         blind = self.options["blind"]
+        if self.history is not None:
+            self.history.blind = blind
 
         # Figure out the players that need to pay the blinds
         if len(self.players) > 2:
@@ -204,62 +339,149 @@ class Game:
             self.turn_index = self.dealer_index
             self.first_bettor = self.dealer_index - 1
 
-        messages.append(f"{small_player.user.display_name} has paid the small blind "
+        messages.append(f"{small_player.name} has paid the small blind "
                         f"of ${blind}.")
 
-        if self.pot.pay_blind(small_player, blind):
-            messages.append(f"{small_player.user.display_name} is all in!")
+        small_all_in = self.pot.pay_blind(small_player, blind)
+        if self.history is not None:
+            self.history.post_blind(small_player.name, "small blind",
+                                    small_player.cur_bet, small_all_in)
+        if small_all_in:
+            messages.append(f"{small_player.name} is all in!")
             self.leave_hand(small_player)
 
-        messages.append(f"{big_player.user.display_name} has paid the big blind "
+        messages.append(f"{big_player.name} has paid the big blind "
                         f"of ${blind * 2}.")
-        if self.pot.pay_blind(big_player, blind * 2):
-            messages.append(f"{big_player.user.display_name} is all in!")
+        big_all_in = self.pot.pay_blind(big_player, blind * 2)
+        if self.history is not None:
+            self.history.post_blind(big_player.name, "big blind",
+                                    big_player.cur_bet, big_all_in)
+        if big_all_in:
+            messages.append(f"{big_player.name} is all in!")
             self.leave_hand(big_player)
 
         return messages
 
+    # Returns the commands the current player can use
+    def prompt(self) -> str:
+        if self.current_player.cur_bet == self.cur_bet:
+            return "Message !check, !strip, !bind, !raise or !fold."
+        elif self.current_player.max_bet > self.cur_bet:
+            return "Message !call, !strip, !bind, !raise or !fold."
+        return "Message !all-in or !fold."
+
     # Returns messages telling the current player their options
     def cur_options(self) -> List[str]:
-        messages = [f"It is {self.current_player.user.display_name}'s turn.\n"
-                    f"{self.current_player.user.display_name} currently has"
+        if self.options["table-view"]:
+            # The table view already shows all of this
+            return []
+        messages = [f"It is {self.current_player.name}'s turn.\n"
+                    f"{self.current_player.name} currently has"
                     f"${self.current_player.balance}.\n"
                     f"The pot is currently ${self.pot.value}."]
         if self.pot.cur_bet > 0:
             messages.append(f"The current bet to meet is ${self.cur_bet}, "
-                            f"and {self.current_player.user.display_name} has bet "
+                            f"and {self.current_player.name} has bet "
                             f"${self.current_player.cur_bet}.")
         else:
             messages.append(f"The current bet to meet is ${self.cur_bet}.")
-        if self.current_player.cur_bet == self.cur_bet:
-            messages.append("Message !check, !strip, !bind, !raise or !fold.")
-        elif self.current_player.max_bet > self.cur_bet:
-            messages.append("Message !call, !strip, !bind, !raise or !fold.")
-        else:
-            messages.append("Message !all-in or !fold.")
+        messages.append(self.prompt())
         return messages
 
+    # Returns the table as one message, showing the board, the pot, each
+    # player's chips and whose turn it is, for the table view
+    def table_view(self) -> str:
+        blind = self.options["blind"]
+        lines = [f"**Pot: ${self.pot.value}**   Blinds: ${blind}/${blind * 2}"]
+        if self.shared_cards:
+            lines.append("Board: " + "  ".join(str(card)
+                                                for card in self.shared_cards))
+        else:
+            lines.append("Board: no cards yet")
+        in_pot = self.pot.in_pot()
+        playing = self.state in HAND_STATES
+        for i, player in enumerate(self.players):
+            line = f"{player.name}: ${player.balance}"
+            if i == self.dealer_index:
+                line += " (dealer)"
+            if playing:
+                if player not in in_pot:
+                    line += ", folded"
+                elif player.user_id not in self.hand_index:
+                    line += ", all in"
+                elif player.cur_bet > 0:
+                    line += f", bet ${player.cur_bet}"
+            if playing and player is self.current_player:
+                line = "➡ " + line
+            lines.append(line)
+        if playing:
+            lines.append(f"It is {self.current_player.name}'s turn, "
+                         f"with ${self.cur_bet} to meet. {self.prompt()}")
+        return "\n".join(lines)
+
+    # Deals some shared cards, adding them to the hand state of each player
+    # still in the pot, so their hands are already evaluated by the showdown
+    def deal_shared(self, count: int) -> None:
+        cards = [self.cur_deck.draw() for _ in range(count)]
+        self.shared_cards += cards
+        for player in self.pot.in_pot():
+            player.hand_state.add(cards)
+        if self.history is not None:
+            self.history.deal(self.shared_cards)
+
+    # Adds what a player did to the current hand's history, if one is kept
+    def note(self, player: Player, text: str) -> None:
+        if self.history is not None:
+            self.history.action(player.name, text, player.balance == 0)
+
+    # Notes a player putting chips in voluntarily, for their stats
+    def note_voluntary(self, player: Player, raised: bool) -> None:
+        if self.hand_stats is not None and self.state == GameState.HANDS_DEALT:
+            self.hand_stats.voluntary(player, raised)
+
+    # Notes who won the hand, for the history and the stats, and puts them
+    # with the finished hands
+    def finish_hand(self, awards: List[Dict[Player, int]],
+                    showdown: Optional[Showdown] = None) -> None:
+        # A bet nobody matched goes back to the player who made it, which
+        # isn't winning it
+        won_awards, uncalled = self.pot.take_uncalled(awards)
+        if self.history is not None:
+            if showdown is not None:
+                for player in showdown.ranking:
+                    self.history.show(player.name, player.cards,
+                                      str(showdown.hands[player]))
+            self.history.award(won_awards, showdown and showdown.hands,
+                               uncalled)
+            self.finished_hands.append(self.history)
+            self.history = None
+        if self.hand_stats is not None:
+            if showdown is not None:
+                self.hand_stats.show(set(showdown.hands))
+            self.hand_stats.award(total_awards(won_awards))
+            self.finished_stats.append(self.hand_stats.rows())
+            self.hand_stats = None
+
     # Advances to the next round of betting (or to the showdown), returning a
     # list messages to tell the players
     def next_round(self) -> List[str]:
         messages: List[str] = []
         if self.state == GameState.HANDS_DEALT:
             messages.append("Dealing the flop:")
-            self.shared_cards.append(self.cur_deck.draw())
-            self.shared_cards.append(self.cur_deck.draw())
-            self.shared_cards.append(self.cur_deck.draw())
+            self.deal_shared(3)
             self.state = GameState.FLOP_DEALT
         elif self.state == GameState.FLOP_DEALT:
             messages.append("Dealing the turn:")
-            self.shared_cards.append(self.cur_deck.draw())
+            self.deal_shared(1)
             self.state = GameState.TURN_DEALT
         elif self.state == GameState.TURN_DEALT:
             messages.append("Dealing the river:")
-            self.shared_cards.append(self.cur_deck.draw())
+            self.deal_shared(1)
             self.state = GameState.RIVER_DEALT
         elif self.state == GameState.RIVER_DEALT:
             return self.showdown()
-        messages.append("  ".join(str(card) for card in self.shared_cards))
+        if not self.options["table-view"]:
+            messages.append("  ".join(str(card) for card in self.shared_cards))
         self.pot.next_round()
         self.turn_index = self.first_bettor
         return messages + self.cur_options()
@@ -277,8 +499,7 @@ class Game:
             return self.cur_options()
 
     def showdown(self) -> List[str]:
-        while len(self.shared_cards) < 5:
-            self.shared_cards.append(self.cur_deck.draw())
+        self.deal_shared(5 - len(self.shared_cards))
 
         messages = ["We have reached the end of betting. "
                     "All cards will be revealed."]
@@ -286,14 +507,17 @@ class Game:
         messages.append("  ".join(str(card) for card in self.shared_cards))
 
         for player in self.pot.in_pot():
-            messages.append(f"{player.user.display_name}'s hand: "
+            messages.append(f"{player.name}'s hand: "
                             f"{player.cards[0]}  {player.cards[1]}")
 
-        winners = self.pot.get_winners(self.shared_cards)
+        showdown = self.pot.showdown(self.shared_cards)
+        awards = self.pot.awards(showdown)
+        winners = total_awards(awards)
         for winner, winnings in sorted(winners.items(), key=lambda item: item[1]):
-            hand_name = str(best_possible_hand(self.shared_cards, winner.cards))
-            messages.append(f"{winner.user.display_name} wins ${winnings} with a {hand_name}.")
+            hand_name = str(showdown.hands[winner])
+            messages.append(f"{winner.name} wins ${winnings} with a {hand_name}.")
             winner.balance += winnings
+        self.finish_hand(awards, showdown)
 
         # Remove players that went all in and lost
         i = 0
@@ -302,11 +526,12 @@ class Game:
             if player.balance > 0:
                 i += 1
             else:
-                messages.append(f"{player.user.display_name} has been knocked out of the game!")
+                messages.append(f"{player.name} has been knocked out of the game!")
                 self.players.pop(i)
+                del self.players_by_id[player.user_id]
                 if len(self.players) == 1:
                     # There's only one player, so they win
-                    messages.append(f"{self.players[0].user.display_name} wins the game! "
+                    messages.append(f"{self.players[0].name} wins the game! "
                                     "Congratulations!")
                     self.state = GameState.NO_GAME
                     return messages
@@ -320,30 +545,47 @@ class Game:
         return messages
 
     # Make the current player check, betting no additional money
+    @action
     def check(self) -> List[str]:
-        self.current_player.placed_bet = True
-        return [f"{self.current_player.user.display_name} checks."] + self.next_turn()
+        self.pot.handle_check(self.current_player)
+        self.note(self.current_player, "checks")
+        return [f"{self.current_player.name} checks."] + self.next_turn()
 
     # Has the current player raise a certain amount
+    @action
     def raise_bet(self, amount: int) -> List[str]:
+        old_bet = self.cur_bet
         self.pot.handle_raise(self.current_player, amount)
-        messages = [f"{self.current_player.user.display_name} raises by ${amount}."]
+        if old_bet == 0:
+            self.note(self.current_player, f"bets ${amount}")
+        else:
+            self.note(self.current_player,
+                      f"raises ${amount} to ${self.cur_bet}")
+        self.note_voluntary(self.current_player, True)
+        messages = [f"{self.current_player.name} raises by ${amount}."]
         if self.current_player.balance == 0:
-            messages.append(f"{self.current_player.user.display_name} is all in!")
+            messages.append(f"{self.current_player.name} is all in!")
             self.leave_hand(self.current_player)
             self.turn_index -= 1
         return messages + self.next_turn()
 
     # Has the current player match the current bet
+    @action
     def call(self) -> List[str]:
+        balance = self.current_player.balance
         self.pot.handle_call(self.current_player)
-        messages = [f"{self.current_player.user.display_name} calls."]
+        paid = balance - self.current_player.balance
+        self.note(self.current_player, f"calls ${paid}" if paid else "checks")
+        if paid:
+            self.note_voluntary(self.current_player, False)
+        messages = [f"{self.current_player.name} calls."]
         if self.current_player.balance == 0:
-            messages.append(f"{self.current_player.user.display_name} is all in!")
+            messages.append(f"{self.current_player.name} is all in!")
             self.leave_hand(self.current_player)
             self.turn_index -= 1
         return messages + self.next_turn()
 
+    @action
     def all_in(self) -> List[str]:
         if self.pot.cur_bet > self.current_player.max_bet:
             return self.call()
@@ -351,32 +593,40 @@ class Game:
             return self.raise_bet(self.current_player.max_bet - self.cur_bet)
 
     # Has the current player strip
+    @action
     def strip(self) -> List[str]:
         if self.current_player.stripcount > 3:
-            messages = [f"{self.current_player.user.display_name} cannot strip, they are naked!"]
+            messages = [f"{self.current_player.name} cannot strip, they are naked!"]
             return messages
         else:
-            messages = [f"{self.current_player.user.display_name} strips."]
+            messages = [f"{self.current_player.name} strips."]
             self.current_player.balance += 10
             self.current_player.stripcount += 1
+            if self.hand_stats is not None:
+                self.hand_stats.add_chips(self.current_player, 10)
             return messages + self.cur_options()
 
     # Has the current player bind
+    @action
     def bind(self) -> List[str]:
         if self.current_player.bindcount > 3:
-            messages = [f"{self.current_player.user.display_name} cannot be bound further...they are completely tied up!"]
+            messages = [f"{self.current_player.name} cannot be bound further...they are completely tied up!"]
             return messages
         else:
-            messages = [f"{self.current_player.user.display_name} gets tied up."]
+            messages = [f"{self.current_player.name} gets tied up."]
             self.current_player.balance += 10
             self.current_player.bindcount += 1
+            if self.hand_stats is not None:
+                self.hand_stats.add_chips(self.current_player, 10)
             return messages + self.cur_options()
 
 
     # Has the current player fold their hand
+    @action
     def fold(self) -> List[str]:
-        messages = [f"{self.current_player.user.display_name} has folded."]
+        messages = [f"{self.current_player.name} has folded."]
         self.pot.handle_fold(self.current_player)
+        self.note(self.current_player, "folds")
         self.leave_hand(self.current_player)
 
     
@@ -384,8 +634,9 @@ class Game:
         # If only one person is left in the pot, give it to them instantly
         if len(self.pot.in_pot()) == 1:
             winner = list(self.pot.in_pot())[0]
-            messages += [f"{winner.user.display_name} wins ${self.pot.value}!"]
+            messages += [f"{winner.name} wins ${self.pot.value}!"]
             winner.balance += self.pot.value
+            self.finish_hand([{winner: self.pot.value}])
             self.state = GameState.NO_HANDS
             self.next_dealer()
             return messages + self.status_between_rounds()
@@ -398,8 +649,9 @@ class Game:
         # Otherwise, have the showdown immediately
         return self.showdown()
 
-        # Send a message to each player, telling them what their hole cards are
-    async def tell_hands(self):
-        for player in self.players:
-            await player.user.send ("Your Hand:" + str(player.cards[0]) + "  "
-                                 + str(player.cards[1]))
\ No newline at end of file
+    # Returns the message to send to each player telling them what their hole
+    # cards are, keyed by the player's user id
+    def hand_messages(self) -> Dict[int, str]:
+        return {player.user_id: "Your Hand:" + str(player.cards[0]) + "  "
+                                + str(player.cards[1])
+                for player in self.players}
@@ -0,0 +1,148 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+import os
+import pickle
+import time
+
+from game import Game, GameState
+
+# How many seconds a table with no game running is kept after it's last used
+IDLE_TTL = 10 * 60
+
+# How many seconds a game in progress is kept in memory after it's last used,
+# before it's spilled to disk, or dropped if there's nowhere to spill it
+ABANDONED_TTL = 24 * 60 * 60
+
+# The most tables kept in memory at once
+MAX_GAMES = 1000
+
+# Keeps the game for each channel, keyed by channel id. Tables that go unused
+# are evicted, least recently used first, so memory doesn't grow forever.
+# Games in progress can be spilled to disk when they're evicted, and are loaded
+# back the next time their channel uses them. If there's nowhere to spill
+# them, they're only dropped once they've been abandoned, never just to make
+# room. on_drop is called with the channel id of each game that's evicted
+# without being spilled
+class GameStore:
+    def __init__(self, spill_dir: Optional[str] = None,
+                 idle_ttl: float = IDLE_TTL,
+                 abandoned_ttl: float = ABANDONED_TTL,
+                 max_games: int = MAX_GAMES,
+                 on_drop: Optional[Callable[[int], None]] = None) -> None:
+        self.spill_dir = spill_dir
+        self.idle_ttl = idle_ttl
+        self.abandoned_ttl = abandoned_ttl
+        self.max_games = max_games
+        self.on_drop = on_drop
+        # The games in memory, from least to most recently used
+        self.games: OrderedDict = OrderedDict()
+        # When each game was last used
+        self.last_used: Dict[int, float] = {}
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self.games)
+
+    # Returns the game for a channel, loading it from disk if it was spilled,
+    # or None if the channel has no game
+    def get(self, channel_id: int) -> Optional[Game]:
+        game = self.games.get(channel_id)
+        if game is None:
+            game = self.load(channel_id)
+            if game is None:
+                return None
+            self.add(channel_id, game)
+        else:
+            self.games.move_to_end(channel_id)
+            self.last_used[channel_id] = time.monotonic()
+        return game
+
+    # Returns the game for a channel, creating one if it doesn't have one
+    def get_or_create(self, channel_id: int) -> Game:
+        game = self.get(channel_id)
+        if game is None:
+            game = Game()
+            self.add(channel_id, game)
+        return game
+
+    # Adds a channel's game. Unless make_room is False, tables are evicted if
+    # there are now too many
+    def add(self, channel_id: int, game: Game, make_room: bool = True) -> None:
+        self.games[channel_id] = game
+        self.last_used[channel_id] = time.monotonic()
+        if make_room:
+            self.evict_over_capacity(channel_id)
+
+    # Evicts the least recently used tables until there are at most max_games,
+    # other than the given channel's. Games in progress that can't be spilled
+    # are skipped, so there may still be too many
+    def evict_over_capacity(self, keep: int) -> None:
+        excess = len(self.games) - self.max_games
+        if excess <= 0:
+            return
+        victims = []
+        for channel_id, game in self.games.items():
+            if len(victims) == excess:
+                break
+            if channel_id != keep and (self.spill_dir is not None
+                                       or game.state == GameState.NO_GAME):
+                victims.append(channel_id)
+        for channel_id in victims:
+            self.evict(channel_id)
+
+    # Returns where a channel's game is spilled to
+    def spill_path(self, channel_id: int) -> str:
+        return os.path.join(self.spill_dir, f"{channel_id}.pickle")
+
+    # Loads a channel's spilled game, removing it from disk, or returns None if
+    # it wasn't spilled
+    def load(self, channel_id: int) -> Optional[Game]:
+        if self.spill_dir is None:
+            return None
+        path = self.spill_path(channel_id)
+        try:
+            with open(path, "rb") as spill_file:
+                game = pickle.load(spill_file)
+        except FileNotFoundError:
+            return None
+        os.remove(path)
+        return game
+
+    # Writes a game to disk, so it can be loaded later
+    def spill(self, channel_id: int, game: Game) -> None:
+        path = self.spill_path(channel_id)
+        # Write to a temporary file first, so a crash can't leave half a game
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as spill_file:
+            pickle.dump(game, spill_file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    # Removes a game from memory, spilling it to disk first if it's in progress
+    def evict(self, channel_id: int) -> None:
+        game = self.games.pop(channel_id)
+        del self.last_used[channel_id]
+        if game.state != GameState.NO_GAME and self.spill_dir is not None:
+            self.spill(channel_id, game)
+        elif self.on_drop is not None:
+            self.on_drop(channel_id)
+
+    # Evicts the tables that haven't been used in a while: tables without a
+    # game after idle_ttl, and abandoned games after abandoned_ttl. Returns
+    # how many tables were evicted
+    def evict_idle(self) -> int:
+        now = time.monotonic()
+        expired = []
+        # The games are in the order they were used, so stop at the first one
+        # that's been used too recently for anything to have expired
+        for channel_id, game in self.games.items():
+            idle = now - self.last_used[channel_id]
+            if idle < min(self.idle_ttl, self.abandoned_ttl):
+                break
+            ttl = (self.idle_ttl if game.state == GameState.NO_GAME
+                   else self.abandoned_ttl)
+            if idle >= ttl:
+                expired.append(channel_id)
+        for channel_id in expired:
+            self.evict(channel_id)
+        return len(expired)
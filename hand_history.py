@@ -0,0 +1,204 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import gzip
+import os
+import queue
+import threading
+
+from player import Player
+from poker import Card, Hand
+
+# The letters tracking tools expect for each rank and suit. The bot's suits
+# have no standard letters, so they're given the usual ones in order
+RANK_LETTERS = "23456789TJQKA"
+SUIT_LETTERS = "cdhs"
+
+# The names of the streets, by how many shared cards have been dealt
+STREETS = {3: "FLOP", 4: "TURN", 5: "RIVER"}
+
+# How many bytes of hand histories go in each file before starting a new one
+MAX_FILE_BYTES = 16 * 1024 * 1024
+
+# Returns a card the way hand histories write it, like "Th"
+def card_code(card: Card) -> str:
+    return RANK_LETTERS[card.value] + SUIT_LETTERS[card.suit_index]
+
+def cards_code(cards: List[Card]) -> str:
+    return "[" + " ".join(card_code(card) for card in cards) + "]"
+
+# The record of one hand, in the format PokerStars writes its hand histories
+# in, which tracking tools can import. The game adds each event to it as the
+# hand is played
+class HandHistory:
+    def __init__(self, hand_id: int, started: datetime, blind: int,
+                 seats: List[Tuple[str, int]], button: int) -> None:
+        self.hand_id = hand_id
+        self.started = started
+        self.blind = blind
+        # Each player's name and their chips when the hand was dealt, in seat
+        # order, and the index of the seat with the button
+        self.seats = seats
+        self.button = button
+        # The lines for the blinds, then for the actions and streets dealt
+        self.blinds: List[str] = []
+        self.lines: List[str] = []
+        # Whether the hand went to a showdown, and the lines for the showdown
+        # and who won what
+        self.showdown = False
+        self.results: List[str] = []
+        # The shared cards written so far
+        self.board: List[Card] = []
+        # What happened to each player, for the summary, by name
+        self.outcomes: Dict[str, str] = {}
+        # How much was won in all
+        self.total = 0
+
+    def post_blind(self, name: str, kind: str, amount: int,
+                   all_in: bool) -> None:
+        self.blinds.append(f"{name}: posts {kind} ${amount}"
+                           + (" and is all-in" if all_in else ""))
+
+    def action(self, name: str, text: str, all_in: bool = False) -> None:
+        self.lines.append(f"{name}: {text}"
+                          + (" and is all-in" if all_in else ""))
+        if text == "folds":
+            if self.board:
+                street = STREETS[len(self.board)].capitalize()
+                self.outcomes[name] = f"folded on the {street}"
+            else:
+                self.outcomes[name] = "folded before Flop"
+
+    # Writes the streets dealt since the last time the board was shown
+    def deal(self, shared_cards: List[Card]) -> None:
+        for count in range(len(self.board) + 1, len(shared_cards) + 1):
+            if count not in STREETS:
+                continue
+            new_cards = shared_cards[len(self.board):count]
+            line = f"*** {STREETS[count]} *** "
+            if self.board:
+                line += cards_code(self.board) + " "
+            self.lines.append(line + cards_code(new_cards))
+            self.board = list(shared_cards[:count])
+
+    def show(self, name: str, cards: Tuple[Card, Card], hand: str) -> None:
+        self.showdown = True
+        shown = cards_code(list(cards))
+        self.results.append(f"{name}: shows {shown} ({hand})")
+        self.outcomes[name] = f"showed {shown} and lost with {hand}"
+
+    # Writes who won each pot, given what each pot paid out to whom, from the
+    # main pot up. A bet nobody matched is written as returned to the player
+    # who made it, and doesn't count as part of the pot
+    def award(self, awards: List[Dict[Player, int]],
+              hands: Optional[Dict[Player, Hand]] = None,
+              uncalled: Optional[Tuple[Player, int]] = None) -> None:
+        if uncalled is not None:
+            player, amount = uncalled
+            self.lines.append(f"Uncalled bet (${amount}) returned to "
+                              f"{player.name}")
+        # A side pot that only held the uncalled bet is left empty, and isn't
+        # a pot at all
+        while len(awards) > 1 and not awards[-1]:
+            awards = awards[:-1]
+        totals: Dict[Player, int] = {}
+        for i, won in reversed(list(enumerate(awards))):
+            if len(awards) == 1:
+                pot_name = "pot"
+            elif i == 0:
+                pot_name = "main pot"
+            else:
+                pot_name = f"side pot-{i}"
+            for winner, amount in won.items():
+                self.results.append(f"{winner.name} collected ${amount} "
+                                    f"from {pot_name}")
+                totals[winner] = totals.get(winner, 0) + amount
+        for winner, amount in totals.items():
+            self.total += amount
+            if hands is not None and winner in hands:
+                self.outcomes[winner.name] = (
+                    f"showed {cards_code(list(winner.cards))} and won "
+                    f"(${amount}) with {hands[winner]}")
+            else:
+                self.outcomes[winner.name] = f"collected (${amount})"
+
+    # Returns the hand history as text, for the table with the given name
+    def text(self, table: str) -> str:
+        big_blind = self.blind * 2
+        lines = [f"PokerStars Hand #{self.hand_id}: Hold'em No Limit "
+                 f"(${self.blind}/${big_blind} USD) - "
+                 f"{self.started:%Y/%m/%d %H:%M:%S}",
+                 f"Table '{table}' {len(self.seats)}-max "
+                 f"Seat #{self.button + 1} is the button"]
+        for seat, (name, chips) in enumerate(self.seats):
+            lines.append(f"Seat {seat + 1}: {name} (${chips} in chips)")
+        lines += self.blinds
+        lines.append("*** HOLE CARDS ***")
+        lines += self.lines
+        if self.showdown:
+            lines.append("*** SHOW DOWN ***")
+        lines += self.results
+        lines.append("*** SUMMARY ***")
+        lines.append(f"Total pot ${self.total} | Rake $0")
+        if self.board:
+            lines.append(f"Board {cards_code(self.board)}")
+        for seat, (name, _) in enumerate(self.seats):
+            button = " (button)" if seat == self.button else ""
+            outcome = self.outcomes.get(name, "didn't win")
+            lines.append(f"Seat {seat + 1}: {name}{button} {outcome}")
+        return "\n".join(lines)
+
+# Writes hand histories on a background thread, so the bot never waits on the
+# disk. They're written to gzip files in a directory, starting a new file once
+# one reaches max_bytes, and the files are flushed whenever the writer catches
+# up, so a crash loses at most the hands still queued
+class HistoryWriter:
+    def __init__(self, directory: str,
+                 max_bytes: int = MAX_FILE_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.queue: queue.Queue = queue.Queue()
+        self.file: Optional[gzip.GzipFile] = None
+        self.written = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # Queues a finished hand to be written, for the table with the given name
+    def submit(self, table: str, history: HandHistory) -> None:
+        self.queue.put((table, history))
+
+    # Writes everything queued, then stops the writer
+    def close(self) -> None:
+        self.queue.put(None)
+        self.thread.join()
+
+    def run(self) -> None:
+        while True:
+            item = self.queue.get()
+            while item is not None:
+                self.write(*item)
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if self.file is not None:
+                self.file.flush()
+            if item is None:
+                break
+        if self.file is not None:
+            self.file.close()
+
+    def write(self, table: str, history: HandHistory) -> None:
+        data = (history.text(table) + "\n\n\n").encode("utf-8")
+        if self.file is None or self.written + len(data) > self.max_bytes:
+            self.rotate()
+        self.file.write(data)
+        self.written += len(data)
+
+    # Closes the current file and starts a new one
+    def rotate(self) -> None:
+        if self.file is not None:
+            self.file.close()
+        name = f"hands-{datetime.now():%Y%m%d-%H%M%S-%f}.txt.gz"
+        self.file = gzip.open(os.path.join(self.directory, name), "wb")
+        self.written = 0
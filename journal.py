@@ -0,0 +1,169 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+import argparse
+import asyncio
+import json
+import os
+import pickle
+import time
+
+from game import Game
+from replay import load_snapshot, read_log, replay
+
+# How many seconds to collect actions for before writing them to disk, so
+# many commands share the cost of one fsync
+COMMIT_INTERVAL = 0.05
+
+# How many actions a game takes between snapshots. The log is cleared after
+# each snapshot, so it never gets longer than this
+SNAPSHOT_EVERY = 500
+
+# Something to write for a game: a line for its action log, a snapshot of the
+# game, or None to delete the game's files
+Write = Union[str, bytes, None]
+
+# Saves each game's actions to disk as they're taken, so the games can be
+# rebuilt after the bot restarts. Each game has an action log, with one action
+# per line, and a snapshot of the game now and then, so rebuilding a game only
+# replays the actions taken since its last snapshot. Actions are written in
+# batches, with one fsync per game per batch
+class Journal:
+    def __init__(self, directory: str, commit_interval: float = COMMIT_INTERVAL,
+                 snapshot_every: int = SNAPSHOT_EVERY) -> None:
+        self.directory = directory
+        self.commit_interval = commit_interval
+        self.snapshot_every = snapshot_every
+        os.makedirs(directory, exist_ok=True)
+        # What's waiting to be written for each game, in order
+        self.pending: Dict[int, List[Write]] = {}
+        # Finishes when the pending writes are on disk
+        self.committed: Optional[asyncio.Future] = None
+        # Writes happen on one thread, so batches are written in order
+        self.writer = ThreadPoolExecutor(max_workers=1)
+
+    def log_path(self, key: int) -> str:
+        return os.path.join(self.directory, f"{key}.log")
+
+    def snapshot_path(self, key: int) -> str:
+        return os.path.join(self.directory, f"{key}.snapshot")
+
+    # Takes the actions a game has taken since it was last recorded, and
+    # queues them to be written, along with a snapshot if one is due
+    def record(self, key: int, game: Game) -> None:
+        entries = game.action_log
+        if not entries:
+            return
+        game.action_log = []
+        writes = [json.dumps(entry) for entry in entries]
+        first = entries[0][0]
+        if (first - 1) // self.snapshot_every \
+                != game.actions_taken // self.snapshot_every:
+            writes.append(pickle.dumps(game, pickle.HIGHEST_PROTOCOL))
+        self.queue(key, writes)
+
+    # Deletes a game's files, once it doesn't need to be rebuilt any more
+    def remove(self, key: int) -> None:
+        self.queue(key, [None])
+
+    def queue(self, key: int, writes: List[Write]) -> None:
+        self.pending.setdefault(key, []).extend(writes)
+        if self.committed is None:
+            self.committed = asyncio.ensure_future(self.commit())
+
+    # Waits until everything queued so far is on disk
+    async def flush(self) -> None:
+        if self.committed is not None:
+            await asyncio.shield(self.committed)
+
+    async def commit(self) -> None:
+        await asyncio.sleep(self.commit_interval)
+        batch = self.pending
+        self.pending = {}
+        # Anything queued from here on goes in the next batch
+        self.committed = None
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self.writer, self.write_batch, batch)
+
+    def write_batch(self, batch: Dict[int, List[Write]]) -> None:
+        for key, writes in batch.items():
+            lines: List[str] = []
+            for write in writes:
+                if isinstance(write, str):
+                    lines.append(write)
+                    continue
+                self.append_lines(key, lines)
+                lines = []
+                if write is None:
+                    self.delete(key)
+                else:
+                    self.write_snapshot(key, write)
+            self.append_lines(key, lines)
+
+    def append_lines(self, key: int, lines: List[str]) -> None:
+        if not lines:
+            return
+        with open(self.log_path(key), "a") as log_file:
+            log_file.write("\n".join(lines) + "\n")
+            log_file.flush()
+            os.fsync(log_file.fileno())
+
+    # Writes a snapshot, then clears the log, which the snapshot covers. If
+    # we crash in between, the snapshot knows how many actions it includes,
+    # so the old log's actions aren't replayed twice
+    def write_snapshot(self, key: int, snapshot: bytes) -> None:
+        path = self.snapshot_path(key)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as snapshot_file:
+            snapshot_file.write(snapshot)
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(temp_path, path)
+        with open(self.log_path(key), "w") as log_file:
+            os.fsync(log_file.fileno())
+
+    def delete(self, key: int) -> None:
+        for path in (self.log_path(key), self.snapshot_path(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # Rebuilds a game from its latest snapshot and the actions logged since
+    def load(self, key: int) -> Game:
+        path = self.log_path(key)
+        game = load_snapshot(path)
+        try:
+            entries = read_log(path)
+        except FileNotFoundError:
+            entries = []
+        game = replay(entries, game).game
+        # The hands the logged actions finished were handed over when the
+        # actions were first taken
+        game.finished_hands = []
+        game.finished_stats = []
+        return game
+
+    # Rebuilds every game with files in the journal, keyed by their keys
+    def recover(self) -> Dict[int, Game]:
+        keys = set()
+        for filename in os.listdir(self.directory):
+            name, extension = os.path.splitext(filename)
+            if extension in (".log", ".snapshot"):
+                keys.add(int(name))
+        return {key: self.load(key) for key in keys}
+
+# Times how long it takes to rebuild every game in a journal
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Rebuilds every game saved in a journal directory, and "
+                    "reports how long it took")
+    parser.add_argument("directory", help="the journal directory")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    games = Journal(args.directory).recover()
+    elapsed = time.perf_counter() - start
+    print(f"Recovered {len(games)} tables in {elapsed:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+import asyncio
+import time
+import traceback
+
+# The longest message discord will let us send
+MESSAGE_LIMIT = 2000
+
+# How many seconds to collect messages for a channel before sending them
+WINDOW = 0.3
+
+# How many seconds to wait for more changes before editing a live message
+EDIT_WINDOW = 1.0
+
+# Discord allows five messages every five seconds in each channel, so sends
+# are paced to one a second, with bursts of up to five
+RATE = 1.0
+BURST = 5
+
+# Sends a message, such as discord.TextChannel.send
+Send = Callable[[str], Awaitable[object]]
+
+# A token bucket, which lets through a burst of up to capacity sends, and then
+# one send every 1 / rate seconds after that
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated = clock()
+
+    # Adds the tokens that have built up since the last update
+    def refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Takes a token, returning how many seconds to wait before using it. The
+    # token can go negative, which reserves a later token
+    def take(self) -> float:
+        self.refill()
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    # Returns how many seconds until the bucket is full again
+    def time_until_full(self) -> float:
+        self.refill()
+        return (self.capacity - self.tokens) / self.rate
+
+# Splits text into messages that fit in discord's limit, breaking between
+# lines where possible
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> List[str]:
+    messages: List[str] = []
+    current = ""
+    for line in text.split("\n"):
+        # A line that's too long by itself has to be broken up
+        while len(line) > limit:
+            if current:
+                messages.append(current)
+                current = ""
+            messages.append(line[:limit])
+            line = line[limit:]
+        if not current:
+            current = line
+        elif len(current) + 1 + len(line) <= limit:
+            current += "\n" + line
+        else:
+            messages.append(current)
+            current = line
+    if current:
+        messages.append(current)
+    return messages
+
+# Collects the messages for one channel over a short window, then sends them
+# merged together, paced by a token bucket so we never hit the rate limit
+class ChannelOutbox:
+    def __init__(self, key: Hashable, send: Send, outbox: 'Outbox') -> None:
+        self.key = key
+        self.send = send
+        self.outbox = outbox
+        self.bucket = TokenBucket(outbox.rate, outbox.burst)
+        self.pending: List[str] = []
+        # Set whenever a message is posted, to wake the sender up
+        self.posted = asyncio.Event()
+        self.task: Optional[asyncio.Future] = None
+
+    def post(self, text: str) -> None:
+        self.pending.append(text)
+        self.posted.set()
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+
+    # Sends a message right away, rather than merging it with the others, but
+    # still paced by the channel's bucket. Returns the sent message
+    async def send_now(self, text: str) -> Any:
+        # Wake the sender up too, so the channel isn't retired before the
+        # bucket has refilled from this send
+        self.posted.set()
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+        await asyncio.sleep(self.bucket.take())
+        return await self.send(text)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.outbox.window)
+            # Cleared before flushing, so anything posted while a send is in
+            # flight wakes the sender straight back up
+            self.posted.clear()
+            await self.flush()
+            # Stick around until the bucket is full again, so a new outbox
+            # for this channel couldn't send faster than this one would
+            try:
+                await asyncio.wait_for(self.posted.wait(),
+                                       self.bucket.time_until_full())
+            except asyncio.TimeoutError:
+                # Nothing can be posted between here and leaving the outbox,
+                # since neither awaits
+                if not self.pending:
+                    self.outbox.retire(self)
+                    return
+
+    # Sends everything that's waiting right away
+    async def flush(self) -> None:
+        text = "\n".join(self.pending)
+        self.pending = []
+        for message in split_message(text):
+            await asyncio.sleep(self.bucket.take())
+            try:
+                await self.send(message)
+            except Exception:
+                traceback.print_exc()
+
+# Buffers the messages for each channel, merging messages sent close together
+# into one, and pacing the sends for each channel
+class Outbox:
+    def __init__(self, window: float = WINDOW, rate: float = RATE,
+                 burst: int = BURST) -> None:
+        self.window = window
+        self.rate = rate
+        self.burst = burst
+        self.channels: Dict[Hashable, ChannelOutbox] = {}
+
+    # Returns the outbox for a channel, making one if it doesn't have one.
+    # send is how to send a message to the channel, and is only used if the
+    # channel has no messages waiting
+    def channel(self, key: Hashable, send: Send) -> ChannelOutbox:
+        channel = self.channels.get(key)
+        if channel is None:
+            channel = ChannelOutbox(key, send, self)
+            self.channels[key] = channel
+        return channel
+
+    # Queues text to be sent to a channel
+    def post(self, key: Hashable, text: str, send: Send) -> None:
+        self.channel(key, send).post(text)
+
+    # Sends text to a channel as a message of its own, as soon as the
+    # channel's rate limit allows. Returns the sent message
+    async def send_now(self, key: Hashable, text: str, send: Send) -> Any:
+        return await self.channel(key, send).send_now(text)
+
+    # Removes a channel that has no more messages to send
+    def retire(self, channel: ChannelOutbox) -> None:
+        if self.channels.get(channel.key) is channel:
+            del self.channels[channel.key]
+
+# A message that's kept up to date by editing it, rather than sending a new
+# message each time it changes. Changes are held back for a short window, and
+# only the latest one is sent, so a burst of changes becomes one edit. The
+# message is first sent with send, which should pace it along with the
+# channel's other messages, like Outbox.send_now does. Edits are rate limited
+# separately from sends, so they're paced by the message's own bucket
+class LiveMessage:
+    def __init__(self, send: Send, window: float = EDIT_WINDOW,
+                 rate: float = RATE, burst: int = BURST) -> None:
+        self.send = send
+        self.window = window
+        self.bucket = TokenBucket(rate, burst)
+        # The message once it's been sent, which has an edit method like
+        # discord.Message
+        self.message: Any = None
+        # The text waiting to be shown, if it's changed since the last edit
+        self.text: Optional[str] = None
+        self.task: Optional[asyncio.Future] = None
+
+    # Changes what the message says
+    def update(self, text: str) -> None:
+        self.text = text[:MESSAGE_LIMIT]
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+
+    async def run(self) -> None:
+        while self.text is not None:
+            await asyncio.sleep(self.window)
+            if self.message is not None:
+                await asyncio.sleep(self.bucket.take())
+            text, self.text = self.text, None
+            try:
+                if self.message is None:
+                    self.message = await self.send(text)
+                else:
+                    await self.message.edit(content=text)
+            except Exception:
+                traceback.print_exc()
+        self.task = None
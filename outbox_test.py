@@ -0,0 +1,169 @@
+from typing import List, Tuple
+import asyncio
+import time
+
+from outbox import LiveMessage, Outbox, split_message, TokenBucket
+
+# Records the messages sent to it, and when they were sent, in place of a
+# discord channel. Sends can be made to take a while, like real ones
+class FakeChannel:
+    def __init__(self, delay: float = 0.0) -> None:
+        self.sent: List[Tuple[float, str]] = []
+        # How many seconds each send takes to finish
+        self.delay = delay
+
+    async def send(self, text: str) -> None:
+        self.sent.append((time.monotonic(), text))
+        await asyncio.sleep(self.delay)
+
+# A sent message, which records its edits
+class FakeMessage:
+    def __init__(self, text: str) -> None:
+        self.edits = [text]
+
+    async def edit(self, content: str) -> None:
+        self.edits.append(content)
+
+# Tests that a burst of changes to a live message becomes one edit
+async def test_live_message() -> None:
+    print("Testing live messages:")
+    sent: List[FakeMessage] = []
+    async def send(text: str) -> FakeMessage:
+        sent.append(FakeMessage(text))
+        return sent[-1]
+
+    tests_passed = 0
+    live = LiveMessage(send, window=0.05, rate=100.0)
+    for i in range(5):
+        live.update(f"version {i}")
+    await asyncio.sleep(0.1)
+    for i in range(5, 10):
+        live.update(f"version {i}")
+    await asyncio.sleep(0.1)
+    if len(sent) == 1 and sent[0].edits == ["version 4", "version 9"]:
+        tests_passed += 1
+    else:
+        print("Test failed! Expected one message with two versions, but got",
+              [message.edits for message in sent])
+    print(f"{tests_passed}/1 tests passed.")
+
+# Tests that long text is split into messages under the limit, without losing
+# or reordering anything
+def test_split_message() -> None:
+    print("Testing message splitting:")
+    tests_passed = 0
+    cases = [
+        ("hello", 10),
+        ("one\ntwo\nthree", 7),
+        ("\n".join("line " + str(i) for i in range(500)), 2000),
+        ("x" * 4500, 2000),
+        ("short\n" + "y" * 25 + "\nend", 10),
+    ]
+    for text, limit in cases:
+        messages = split_message(text, limit)
+        rejoined = "".join(messages).replace("\n", "")
+        if all(len(message) <= limit for message in messages) \
+                and rejoined == text.replace("\n", ""):
+            tests_passed += 1
+        else:
+            print("Test failed! Couldn't split", repr(text[:40]),
+                  "into messages of at most", limit, "characters:")
+            print(messages)
+    print(f"{tests_passed}/{len(cases)} tests passed.")
+
+# Tests that a token bucket lets a burst through, then paces the rest
+def test_token_bucket() -> None:
+    print("Testing token bucket:")
+    now = [0.0]
+    bucket = TokenBucket(2.0, 3, clock=lambda: now[0])
+    tests_passed = 0
+    # A full bucket lets three through, then one every half second
+    waits = [bucket.take() for _ in range(5)]
+    expected = [0.0, 0.0, 0.0, 0.5, 1.0]
+    if waits == expected:
+        tests_passed += 1
+    else:
+        print("Test failed! Expected waits of", expected, "but got", waits)
+    # After a long pause, the bucket is full again, but no fuller
+    now[0] = 10.0
+    waits = [bucket.take() for _ in range(4)]
+    expected = [0.0, 0.0, 0.0, 0.5]
+    if waits == expected:
+        tests_passed += 1
+    else:
+        print("Test failed! After refilling, expected waits of", expected,
+              "but got", waits)
+    print(f"{tests_passed}/2 tests passed.")
+
+# Tests that messages posted close together are merged, and that sends are
+# paced by the bucket rather than all going out at once
+async def test_outbox() -> None:
+    print("Testing outbox:")
+    tests_passed = 0
+    outbox = Outbox(window=0.05, rate=20.0, burst=2)
+    first = FakeChannel()
+    second = FakeChannel()
+
+    outbox.post(1, "one", first.send)
+    outbox.post(1, "two", first.send)
+    outbox.post(2, "other", second.send)
+    await asyncio.sleep(0.1)
+    if [text for _, text in first.sent] == ["one\ntwo"] \
+            and [text for _, text in second.sent] == ["other"]:
+        tests_passed += 1
+    else:
+        print("Test failed! Messages weren't merged per channel:")
+        print(first.sent, second.sent)
+
+    # Four messages' worth of text: the first two go out in a burst, and the
+    # rest at 20 a second
+    outbox.post(1, "\n".join(["z" * 1500] * 4), first.send)
+    await asyncio.sleep(0.3)
+    times = [sent for sent, _ in first.sent[1:]]
+    if len(times) == 4 and times[-1] - times[0] >= 0.09:
+        tests_passed += 1
+    else:
+        print("Test failed! Sends weren't paced:", times)
+
+    # Once everything's sent and the buckets are full, the channels are dropped
+    await asyncio.sleep(0.3)
+    if not outbox.channels:
+        tests_passed += 1
+    else:
+        print("Test failed! Idle channels weren't retired:",
+              list(outbox.channels))
+
+    # A message sent right away still waits for the channel's bucket
+    outbox = Outbox(window=0.01, rate=10.0, burst=1)
+    third = FakeChannel()
+    await outbox.send_now(3, "view", third.send)
+    outbox.post(3, "reply", third.send)
+    await asyncio.sleep(0.2)
+    times = [sent for sent, _ in third.sent]
+    if len(times) == 2 and times[1] - times[0] >= 0.09:
+        tests_passed += 1
+    else:
+        print("Test failed! A message sent right away skipped the bucket:",
+              third.sent)
+
+    # A message posted while a slow send is in flight goes out as soon as
+    # that send finishes, rather than once the bucket has refilled
+    outbox = Outbox(window=0.05, rate=1.0, burst=5)
+    fourth = FakeChannel(delay=0.2)
+    outbox.post(4, "first", fourth.send)
+    await asyncio.sleep(0.1)
+    posted = time.monotonic()
+    outbox.post(4, "second", fourth.send)
+    await asyncio.sleep(0.5)
+    times = [sent for sent, _ in fourth.sent]
+    if len(times) == 2 and times[1] - posted < 0.3:
+        tests_passed += 1
+    else:
+        print("Test failed! A message posted during a send was held back:",
+              [sent - posted for sent in times])
+    print(f"{tests_passed}/5 tests passed.")
+
+test_split_message()
+test_token_bucket()
+asyncio.run(test_outbox())
+asyncio.run(test_live_message())
@@ -1,18 +1,20 @@
-from typing import Tuple
+from typing import Optional, Tuple
 
-import discord
-
-from poker import Card
+from poker import Card, Hand, HandState
 
 # A class that contains information on an individual player
 class Player:
-    def __init__(self, user: discord.User) -> None:
+    def __init__(self, user_id: int, name: str) -> None:
         # How many chips the player has
         self.balance = 0
-        # The discord user associated with the player
-        self.user = user
+        # The id of the user playing, and the name to show them by
+        self.user_id = user_id
+        self.name = name
         # The player's hole cards
         self.cards: Tuple[Card, Card] = None
+        # The evaluator's state for the player's hole cards and the shared
+        # cards dealt so far
+        self.hand_state: HandState = None
         # How many chips the player has bet this round
         self.cur_bet = 0
         # Whether the player has placed a bet yet this round
@@ -22,9 +24,13 @@ class Player:
          # the count for !bind
         self.bindcount = 0
 
+    # The best hand the player can make with the cards dealt so far, or None
+    # if the flop hasn't been dealt
     @property
-    def name(self) -> str:
-        return self.user.name
+    def current_hand(self) -> Optional[Hand]:
+        if self.hand_state is None or self.hand_state.count < 5:
+            return None
+        return Hand.from_score(self.hand_state.score)
 
     # The maximum bet that the player can match
     @property
@@ -1,10 +1,15 @@
+from array import array
 from collections import namedtuple
 from enum import Enum
 from functools import total_ordering
-from itertools import combinations
-from typing import List, Tuple
+from itertools import combinations, combinations_with_replacement
+from typing import Dict, List, Optional, Sequence, Tuple
+import mmap
+import os
 import random
 
+import entropy
+
 SUITS = ('⛓', '🕸', '🔑', '🔒')
 
 
@@ -43,175 +48,528 @@ class HandRanking(Enum):
     def __lt__(self, other):
         return self.value < other.value
 
-# A simple class representing a card
+# The prime number associated with each card rank, indexed by rank value. The
+# product of the primes of five cards is unique to the ranks in the hand, which
+# lets us look up paired hands without sorting them
+PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+# A simple class representing a card. There are only ever 52 cards, one for
+# each suit and rank, and they can't be changed, so Card(suit, rank) hands
+# back the same object every time instead of making a new one
 @total_ordering
 class Card:
-    def __init__(self, suit: str, rank: str) -> None:
-        self.suit = suit
-        self.rank = rank
+    __slots__ = ("suit", "rank", "value", "suit_index", "index", "mask",
+                 "code", "text")
+
+    def __new__(cls, suit: str, rank: str) -> 'Card':
+        return CARDS[SUITS.index(suit) * 13 + RANK_INFO[rank].value]
+
+    # Makes one of the 52 cards. This is only called when the module loads
+    @classmethod
+    def make(cls, suit: str, rank: str) -> 'Card':
+        card = object.__new__(cls)
+        value = RANK_INFO[rank].value
+        suit_index = SUITS.index(suit)
+        fields = {
+            "suit": suit,
+            "rank": rank,
+            # The value of the card's rank, and the position of its suit in
+            # SUITS
+            "value": value,
+            "suit_index": suit_index,
+            # Where the card falls in a 52-card deck, from 0 to 51
+            "index": suit_index * 13 + value,
+            # A bit set for the card's rank
+            "mask": 1 << value,
+            # The card packed into an integer for the hand evaluator. The bits
+            # are laid out as:
+            #   xxxbbbbb bbbbbbbb ssssrrrr xxpppppp
+            # where b is a bit set for the card's rank, s is a bit set for the
+            # card's suit, r is the rank value and p is the rank's prime
+            "code": ((1 << value) << 16 | (1 << suit_index) << 12
+                     | value << 8 | PRIMES[value]),
+            "text": suit + rank,
+        }
+        for field, field_value in fields.items():
+            object.__setattr__(card, field, field_value)
+        return card
+
+    def __setattr__(self, name, value):
+        raise AttributeError("cards can't be changed")
+
+    # Cards are unpickled as the same object as the card already in this
+    # process, so they can be sent to other processes
+    def __reduce__(self):
+        return Card, (self.suit, self.rank)
 
     # When comparing two cards, suit doesn't matter, just the rank of the card
     def __lt__(self, other):
-        return RANK_INFO[self.rank].value < RANK_INFO[other.rank].value
+        return self.value < other.value
 
     def __eq__(self, other):
-        return self.rank == other.rank
+        return self.value == other.value
 
     def __str__(self) -> str:
-        return self.suit + self.rank
+        return self.text
 
     @property
     def name(self) -> str:
-        return RANK_INFO[self.rank].name
+        return RANKS_BY_VALUE[self.value].name
 
     @property
     def plural(self) -> str:
-        return RANK_INFO[self.rank].plural
+        return RANKS_BY_VALUE[self.value].plural
+
+# All 52 cards, in order of their index
+CARDS = tuple(Card.make(suit, rank) for suit in SUITS for rank in RANK_INFO)
+
+# The rank info for each rank, indexed by the rank's value
+RANKS_BY_VALUE = sorted(RANK_INFO.values(), key=lambda info: info.value)
+
+# Hand scores are a single integer, where a higher score is a better hand. The
+# hand's ranking is stored above SCORE_SHIFT, and below it are the values of
+# up to five cards that decide ties, four bits each, most important first
+SCORE_SHIFT = 20
+
+# Packs a hand ranking and the tie-breaking card values into a score
+def pack_score(ranking: HandRanking, values: List[int]) -> int:
+    score = ranking.value
+    for value in values:
+        score = score << 4 | value
+    return score << 4 * (5 - len(values))
+
+# Returns the value of the top card of the straight made by a 13-bit mask of
+# ranks, or None if the ranks don't make a straight
+def straight_top(rank_mask: int) -> Optional[int]:
+    for top in range(12, 3, -1):
+        straight = 0b11111 << (top - 4)
+        if rank_mask & straight == straight:
+            return top
+    # Check for the special case of an ace-low straight
+    if rank_mask & 0b1000000001111 == 0b1000000001111:
+        return 3
+    return None
+
+# Scores a five-card hand given the values of its cards, and whether it's a
+# flush. This is slow, and is only used to build the lookup tables
+def score_values(values: List[int], flush: bool) -> int:
+    counts: Dict[int, int] = {}
+    rank_mask = 0
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+        rank_mask |= 1 << value
+    # Order the values by how many times they appear, then by how high they
+    # are, so the cards that decide ties come first
+    groups = sorted(counts.items(), key=lambda item: (item[1], item[0]),
+                    reverse=True)
+    ordered = [value for value, _ in groups]
+    shape = [count for _, count in groups]
+
+    top = straight_top(rank_mask) if len(counts) == 5 else None
+    if top is not None:
+        if flush:
+            return pack_score(HandRanking.STRAIGHT_FLUSH, [top])
+        return pack_score(HandRanking.STRAIGHT, [top])
+    if flush:
+        return pack_score(HandRanking.FLUSH, ordered)
+    if shape == [4, 1]:
+        return pack_score(HandRanking.FOUR_OF_KIND, ordered)
+    if shape == [3, 2]:
+        return pack_score(HandRanking.FULL_HOUSE, ordered)
+    if shape == [3, 1, 1]:
+        return pack_score(HandRanking.THREE_OF_KIND, ordered)
+    if shape == [2, 2, 1]:
+        return pack_score(HandRanking.TWO_PAIR, ordered)
+    if shape == [2, 1, 1, 1]:
+        return pack_score(HandRanking.PAIR, ordered)
+    return pack_score(HandRanking.HIGH_CARD, ordered)
+
+# Builds the lookup tables for the five-card evaluator. Hands with five
+# different ranks are looked up by their rank bits, one table for flushes and
+# one for everything else. Hands with a pair or better are looked up by the
+# product of their rank primes
+def build_five_card_tables() -> Tuple[List[int], List[int], Dict[int, int]]:
+    flushes = [0] * (1 << 13)
+    unique = [0] * (1 << 13)
+    products: Dict[int, int] = {}
+    for values in combinations_with_replacement(range(13), 5):
+        if max(values.count(value) for value in values) > 4:
+            continue
+        if len(set(values)) == 5:
+            rank_mask = sum(1 << value for value in values)
+            flushes[rank_mask] = score_values(list(values), True)
+            unique[rank_mask] = score_values(list(values), False)
+        else:
+            product = 1
+            for value in values:
+                product *= PRIMES[value]
+            products[product] = score_values(list(values), False)
+    return flushes, unique, products
+
+FLUSH_SCORES, UNIQUE_SCORES, PRODUCT_SCORES = build_five_card_tables()
+
+# Scores a five-card hand from the integer codes of its cards with a single
+# table lookup. Higher scores are better hands
+def score_five(c1: int, c2: int, c3: int, c4: int, c5: int) -> int:
+    rank_mask = (c1 | c2 | c3 | c4 | c5) >> 16
+    if c1 & c2 & c3 & c4 & c5 & 0xF000:
+        return FLUSH_SCORES[rank_mask]
+    score = UNIQUE_SCORES[rank_mask]
+    if score:
+        return score
+    return PRODUCT_SCORES[(c1 & 0xFF) * (c2 & 0xFF) * (c3 & 0xFF)
+                          * (c4 & 0xFF) * (c5 & 0xFF)]
+
+# Returns the score of a five-card hand
+def evaluate(cards: List[Card]) -> int:
+    return score_five(*(card.code for card in cards))
+
+# Returns the description of the hand with the given score
+def describe_score(score: int) -> str:
+    ranking = HandRanking(score >> SCORE_SHIFT)
+    first = RANKS_BY_VALUE[score >> 16 & 0xF]
+    second = RANKS_BY_VALUE[score >> 12 & 0xF]
+    if ranking == HandRanking.HIGH_CARD:
+        return first.name + " high"
+    elif ranking == HandRanking.PAIR:
+        return "pair of " + first.plural
+    elif ranking == HandRanking.TWO_PAIR:
+        return "two pair, " + first.plural + " and " + second.plural
+    elif ranking == HandRanking.THREE_OF_KIND:
+        return "three of a kind, " + first.plural
+    elif ranking == HandRanking.STRAIGHT:
+        return first.name + "-high straight"
+    elif ranking == HandRanking.FLUSH:
+        return first.name + "-high flush"
+    elif ranking == HandRanking.FULL_HOUSE:
+        return "full house, " + first.plural + " over " + second.plural
+    elif ranking == HandRanking.FOUR_OF_KIND:
+        return "four of a kind, " + first.plural
+    elif ranking == HandRanking.STRAIGHT_FLUSH:
+        if first.value == RANK_INFO["A"].value:
+            return "royal flush"
+        else:
+            return first.name + "-high straight flush"
 
 # A class for representing a 5-card hand, and allowing for the easy comparison
-# of hands
-@total_ordering
+# of hands. Hands are compared and hashed by their score, which packs the
+# hand's ranking and the cards that break ties into one integer, and are only
+# turned into a description when they're printed
 class Hand:
+    __slots__ = ("cards", "score")
+
     def __init__(self, cards: List[Card]) -> None:
-        # Sort the cards first thing to make hands easier to compare
-        self.cards = sorted(cards)
+        # Sort the cards first thing to make hands easier to read
+        self.cards: Optional[List[Card]] = sorted(cards)
+        self.score = evaluate(cards)
 
-        # Gets a list of the duplicated cards (pairs, three-of-a-kinds, etc)
-        dups = self.get_dups()
+    # Makes a hand straight from its score, for when the evaluator has already
+    # scored it. These hands don't know which cards they were made from
+    @classmethod
+    def from_score(cls, score: int) -> 'Hand':
+        hand = cls.__new__(cls)
+        hand.cards = None
+        hand.score = score
+        return hand
 
-        # At this point, we determine the ranking of the hand
-        if self.is_flush():
-            if self.is_straight():
-                self.rank = HandRanking.STRAIGHT_FLUSH
-            else:
-                self.rank = HandRanking.FLUSH
-        elif self.is_straight():
-            self.rank = HandRanking.STRAIGHT
-        elif dups:
-            if len(dups) == 2:
-                if len(dups[1]) == 3:
-                    self.rank = HandRanking.FULL_HOUSE
-                else:
-                    self.rank = HandRanking.TWO_PAIR
-            else:
-                if len(dups[0]) == 4:
-                    self.rank = HandRanking.FOUR_OF_KIND
-                elif len(dups[0]) == 3:
-                    self.rank = HandRanking.THREE_OF_KIND
-                else:
-                    self.rank = HandRanking.PAIR
-            self.rearrange_dups(dups)
-        else:
-            self.rank = HandRanking.HIGH_CARD
+    @property
+    def rank(self) -> HandRanking:
+        return HandRanking(self.score >> SCORE_SHIFT)
 
+    # Each comparison is a single comparison of the scores, so max() and
+    # sorted() don't go through functools.total_ordering's extra calls
     def __lt__(self, other):
-        if self.rank < other.rank:
-            return True
-        if self.rank > other.rank:
-            return False
-        for self_card, other_card in zip(self.cards[::-1], other.cards[::-1]):
-            if self_card < other_card:
-                return True
-            elif self_card > other_card:
-                return False
-        return False
+        return self.score < other.score
+
+    def __le__(self, other):
+        return self.score <= other.score
+
+    def __gt__(self, other):
+        return self.score > other.score
+
+    def __ge__(self, other):
+        return self.score >= other.score
 
     def __eq__(self, other):
-        if self.rank != other.rank:
-            return False
-        for self_card, other_card in zip(self.cards, other.cards):
-            if self_card != other_card:
-                return False
-        return True
+        if not isinstance(other, Hand):
+            return NotImplemented
+        return self.score == other.score
+
+    # Hands that tie hash the same, so hands can be used as dictionary keys
+    def __hash__(self):
+        return hash(self.score)
 
     def __str__(self):
-        if self.rank == HandRanking.HIGH_CARD:
-            return self.cards[4].name + " high"
-        elif self.rank == HandRanking.PAIR:
-            return "pair of " + self.cards[4].plural
-        elif self.rank == HandRanking.TWO_PAIR:
-            return "two pair, " + self.cards[4].plural + " and " + self.cards[2].plural
-        elif self.rank == HandRanking.THREE_OF_KIND:
-            return "three of a kind, " + self.cards[4].plural
-        elif self.rank == HandRanking.STRAIGHT:
-            return self.cards[4].name + "-high straight"
-        elif self.rank == HandRanking.FLUSH:
-            return self.cards[4].name + "-high flush"
-        elif self.rank == HandRanking.FULL_HOUSE:
-            return "full house, " + self.cards[4].plural + " over " + self.cards[1].plural
-        elif self.rank == HandRanking.FOUR_OF_KIND:
-            return "four of a kind, " + self.cards[4].plural
-        elif self.rank == HandRanking.STRAIGHT_FLUSH:
-            if self.cards[4].rank == 'A':
-                return "royal flush"
-            else:
-                return self.cards[4].name + "-high straight flush"
-
-    # Rearrange the duplicated cards in the hand so that comparing two hands
-    # with the same ranking is easier
-    # This moves duplicated cards to the end of the hand
-    def rearrange_dups(self, dups: List[List[Card]]) -> None:
-        flat_dups = [card for cards in dups for card in cards]
-        for dup in flat_dups:
-            self.cards.pop(self.cards.index(dup))
-        self.cards += flat_dups
-
-    # Returns whether the hand is a straight
-    def is_straight(self) -> bool:
-        ranks = [RANK_INFO[card.rank].value for card in self.cards]
-        # Check to see if each card is exactly one better than the previous card
-        for i in range(1, 5):
-            if ranks[i - 1] != ranks[i] - 1:
-                break
+        return describe_score(self.score)
+
+# The file that the seven-card evaluator's table is saved to. It's generated
+# the first time it's needed, and then shared between bot processes through
+# mmap
+HAND_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               "hand_ranks.dat")
+
+# The first entry in the table file, so we don't load a file that isn't ours
+HAND_TABLE_MAGIC = 0x48524B31
+
+# The table is an array of unsigned 32-bit ints. After the magic number, it
+# has the best flush that can be made from each 13-bit mask of ranks in one
+# suit, and then the rank states. Each rank state takes up 14 entries: the
+# position of the state reached by adding a card of each of the 13 ranks,
+# followed by the best score that can be made from the state's ranks without
+# a flush
+FLUSH_TABLE_OFFSET = 1
+HAND_TABLE_ROOT = FLUSH_TABLE_OFFSET + (1 << 13)
+STATE_SIZE = 14
+
+# Returns the best score that can be made from the cards with the given rank
+# values, ignoring flushes
+def best_rank_score(values: List[int]) -> int:
+    best = 0
+    for hand in combinations(values, 5):
+        if len(set(hand)) == 5:
+            score = UNIQUE_SCORES[sum(1 << value for value in hand)]
+        else:
+            product = 1
+            for value in hand:
+                product *= PRIMES[value]
+            score = PRODUCT_SCORES[product]
+        best = max(best, score)
+    return best
+
+# Builds the seven-card evaluator's table, returning it as an array
+def build_hand_table() -> array:
+    table = array('I', [HAND_TABLE_MAGIC])
+
+    # The best flush or straight flush for each set of ranks in one suit
+    for rank_mask in range(1 << 13):
+        values = [value for value in range(12, -1, -1)
+                  if rank_mask & (1 << value)]
+        if len(values) < 5:
+            table.append(0)
+        elif straight_top(rank_mask) is not None:
+            table.append(pack_score(HandRanking.STRAIGHT_FLUSH,
+                                    [straight_top(rank_mask)]))
         else:
-            # If we've reached this point, each card was exactly one rank
-            # higher than the previous card.
-            return True
-        # Check for the special case of an ace-low straight
-        if ranks == [0, 1, 2, 3, 12]:
-            self.cards = [self.cards[-1]] + self.cards[:-1]
-            return True
-        return False
-
-    # Returns whether a hand is a flush, meaning all the cards are the same suit
-    def is_flush(self) -> bool:
-        suit = self.cards[0].suit
-        for card in self.cards[1:]:
-            if card.suit != suit:
-                return False
-        return True
-
-    # Returns a list of the pairs, three-of-a-kinds and four-of-a-kinds in the hand
-    def get_dups(self) -> List[List[Card]]:
-        dups: List[List[Card]] = []
-        cur_dup: List[Card] = [self.cards[0]]
-        for card in self.cards[1:]:
-            if cur_dup[0] != card:
-                if len(cur_dup) > 1:
-                    dups.append(cur_dup)
-                cur_dup = [card]
+            table.append(pack_score(HandRanking.FLUSH, values[:5]))
+
+    # Number each state, a count of how many cards of each rank have been
+    # seen, in the order they're reached from the empty state
+    positions: Dict[Tuple[int, ...], int] = {}
+    states: List[Tuple[int, ...]] = [(0,) * 13]
+    positions[states[0]] = HAND_TABLE_ROOT
+    for counts in states:
+        if sum(counts) == 7:
+            continue
+        for value in range(13):
+            if counts[value] < 4:
+                child = counts[:value] + (counts[value] + 1,) + counts[value + 1:]
+                if child not in positions:
+                    positions[child] = HAND_TABLE_ROOT + len(states) * STATE_SIZE
+                    states.append(child)
+
+    for counts in states:
+        for value in range(13):
+            if sum(counts) < 7 and counts[value] < 4:
+                child = counts[:value] + (counts[value] + 1,) + counts[value + 1:]
+                table.append(positions[child])
             else:
-                cur_dup.append(card)
-        if len(cur_dup) > 1:
-            dups.append(cur_dup)
-        # For full houses, make it so the three-of-a-kind is always second in
-        # the list of duplicates
-        if len(dups) == 2 and len(dups[0]) > len(dups[1]):
-            dups[0], dups[1] = dups[1], dups[0]
-        return dups
+                table.append(0)
+        if sum(counts) >= 5:
+            table.append(best_rank_score([value for value in range(13)
+                                          for _ in range(counts[value])]))
+        else:
+            table.append(0)
+    return table
+
+# Writes the seven-card evaluator's table to a file. The table is written to a
+# temporary file first, so another process never sees half of it
+def write_hand_table(path: str = HAND_TABLE_PATH) -> None:
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as table_file:
+        build_hand_table().tofile(table_file)
+    os.replace(temp_path, path)
+
+hand_table: Optional[memoryview] = None
+
+# Returns the seven-card evaluator's table, memory-mapping it from its file the
+# first time this is called, and generating the file if it doesn't exist yet
+def load_hand_table() -> memoryview:
+    global hand_table
+    if hand_table is None:
+        if not os.path.exists(HAND_TABLE_PATH):
+            write_hand_table()
+        with open(HAND_TABLE_PATH, "rb") as table_file:
+            mapped = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        table = memoryview(mapped).cast('I')
+        if table[0] != HAND_TABLE_MAGIC:
+            raise ValueError(f"{HAND_TABLE_PATH} is not a hand table. "
+                             "Delete it to have it generated again.")
+        hand_table = table
+    return hand_table
+
+# Scores the best five-card hand that can be made from five to seven cards,
+# by walking the table one card at a time
+def evaluate_seven(cards: Sequence[Card]) -> int:
+    table = hand_table if hand_table is not None else load_hand_table()
+    state = HAND_TABLE_ROOT
+    suit_masks = [0, 0, 0, 0]
+    for card in cards:
+        state = table[state + card.value]
+        suit_masks[card.suit_index] |= card.mask
+    score = table[state + 13]
+    for suit_mask in suit_masks:
+        flush = table[FLUSH_TABLE_OFFSET + suit_mask]
+        if flush > score:
+            score = flush
+    return score
+
+# A player's progress through the seven-card evaluator's table, so that the
+# shared cards can be added a street at a time as they're dealt. Once five
+# cards have been added, the score of the best hand so far is a few reads away
+class HandState:
+    __slots__ = ("state", "suit_masks", "count")
+
+    def __init__(self, cards: Sequence[Card] = ()) -> None:
+        self.state = HAND_TABLE_ROOT
+        self.suit_masks = [0, 0, 0, 0]
+        # How many cards have been added so far
+        self.count = 0
+        self.add(cards)
+
+    # Adds newly dealt cards to the state
+    def add(self, cards: Sequence[Card]) -> None:
+        table = hand_table if hand_table is not None else load_hand_table()
+        state = self.state
+        for card in cards:
+            state = table[state + card.value]
+            self.suit_masks[card.suit_index] |= card.mask
+        self.state = state
+        self.count += len(cards)
+
+    # The score of the best hand that can be made from the cards so far, or
+    # zero if there aren't five cards yet
+    @property
+    def score(self) -> int:
+        table = hand_table if hand_table is not None else load_hand_table()
+        score = table[self.state + 13]
+        for suit_mask in self.suit_masks:
+            flush = table[FLUSH_TABLE_OFFSET + suit_mask]
+            if flush > score:
+                score = flush
+        return score
 
 # Returns the best possible 5-card hand that can be made from the five
 # community cards and a player's two hole cards
 def best_possible_hand(public: List[Card], private: Tuple[Card, Card]) -> Hand:
-    return max(Hand(list(hand))
-               for hand in combinations(tuple(public) + private, 5))
+    return Hand.from_score(evaluate_seven(tuple(public) + tuple(private)))
+
+# How many hands rank_many works on at once, to bound its memory use
+RANK_MANY_CHUNK = 1 << 20
+
+# Scores many hands at once. boards is an array of shape (n, 3) to (n, 5), and
+# holes is an array of shape (n, 2), both holding card indices (see
+# Card.index). Returns an array of the n scores, the same as evaluate_seven
+# would give for each board and pair of hole cards. Requires numpy
+def rank_many(boards, holes):
+    import numpy as np
+
+    cards = np.concatenate((np.asarray(boards, dtype=np.intp),
+                            np.asarray(holes, dtype=np.intp)), axis=1)
+    table = np.frombuffer(load_hand_table(), dtype=np.uint32)
+    scores = np.empty(len(cards), dtype=np.uint32)
+    for start in range(0, len(cards), RANK_MANY_CHUNK):
+        chunk = cards[start:start + RANK_MANY_CHUNK]
+        values = chunk % 13
+        suits = chunk // 13
+
+        # Walk the rank states for every hand at once, one card at a time
+        states = np.full(len(chunk), HAND_TABLE_ROOT, dtype=np.intp)
+        for column in values.T:
+            states = table[states + column].astype(np.intp)
+        chunk_scores = table[states + 13]
+
+        # Only one suit can have five cards, so look up the flush for the
+        # most common suit of each hand. If it has less than five cards, the
+        # flush table gives a score of zero
+        suit_counts = (suits[:, :, np.newaxis] == np.arange(4)).sum(axis=1)
+        flush_suits = suit_counts.argmax(axis=1)
+        rank_masks = np.where(suits == flush_suits[:, np.newaxis],
+                              1 << values, 0).sum(axis=1)
+        flushes = table[FLUSH_TABLE_OFFSET + rank_masks]
+        scores[start:start + RANK_MANY_CHUNK] = np.maximum(chunk_scores, flushes)
+    return scores
+
+# The file that the heads-up preflop equity table is saved to. It's made by
+# build_preflop_table.py, and is only read the first time it's needed
+PREFLOP_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  "preflop_equity.dat")
 
-# A class for representing a simple, randomized deck that can be drawn from
+# The first two entries in the preflop table file
+PREFLOP_TABLE_MAGIC = (0x5046, 0x4531)
+
+# How many kinds of starting hands there are: thirteen pairs, and 78 suited and
+# 78 offsuit pairs of ranks
+STARTING_HANDS = 169
+
+# Returns which of the 169 kinds of starting hand the hole cards are. They're
+# laid out on a 13x13 grid, with pairs along the diagonal, suited hands above
+# it, and offsuit hands below it
+def starting_hand_class(cards: Tuple[Card, Card]) -> int:
+    high = max(cards[0].value, cards[1].value)
+    low = min(cards[0].value, cards[1].value)
+    if cards[0].suit_index == cards[1].suit_index:
+        return low * 13 + high
+    return high * 13 + low
+
+preflop_table: Optional[array] = None
+
+# Returns the preflop equity table, reading it from its file the first time
+# this is called. Returns None if the table hasn't been built
+def load_preflop_table() -> Optional[array]:
+    global preflop_table
+    if preflop_table is None:
+        if not os.path.exists(PREFLOP_TABLE_PATH):
+            return None
+        table = array('H')
+        with open(PREFLOP_TABLE_PATH, "rb") as table_file:
+            table.frombytes(table_file.read())
+        if tuple(table[:2]) != PREFLOP_TABLE_MAGIC:
+            raise ValueError(f"{PREFLOP_TABLE_PATH} is not a preflop table. "
+                             "Run build_preflop_table.py to build it again.")
+        preflop_table = table
+    return preflop_table
+
+# Returns the chances of one pair of hole cards winning and tying against
+# another before the flop, or None if the preflop table hasn't been built
+def preflop_equity(hand: Tuple[Card, Card],
+                   other: Tuple[Card, Card]) -> Optional[Tuple[float, float]]:
+    table = preflop_table if preflop_table is not None else load_preflop_table()
+    if table is None:
+        return None
+    position = 2 + 2 * (starting_hand_class(hand) * STARTING_HANDS
+                        + starting_hand_class(other))
+    return table[position] / 0xFFFF, table[position + 1] / 0xFFFF
+
+# A class for representing a simple, randomized deck that can be drawn from.
+# Each deck is shuffled by its own generator, so a deck shuffled with the same
+# seed always comes out in the same order. Secure decks are shuffled with
+# entropy from the operating system instead, so they can't be predicted, or
+# repeated from a seed
 class Deck:
-    def __init__(self):
-        self.cards = [Card(suit, rank) for suit in SUITS
-                                       for rank in RANK_INFO]
-        random.shuffle(self.cards)
+    def __init__(self, seed: Optional[int] = None, secure: bool = False) -> None:
+        self.cards = list(CARDS)
+        if secure:
+            entropy.pool.shuffle(self.cards)
+        else:
+            random.Random(seed).shuffle(self.cards)
+
+    # Returns a deck stacked in the given order of card indexes, with the
+    # first card to be drawn last
+    @classmethod
+    def stacked(cls, order: List[int]) -> 'Deck':
+        deck = cls.__new__(cls)
+        deck.cards = [CARDS[index] for index in order]
+        return deck
 
     def draw(self) -> Card:
         return self.cards.pop()
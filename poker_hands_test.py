@@ -1,6 +1,6 @@
 from typing import List, Tuple
 
-from poker import Card, Hand, best_possible_hand
+from poker import Card, Deck, Hand, best_possible_hand, rank_many
 
 HoleCards = Tuple[Card, Card]
 
@@ -29,8 +29,8 @@ def test_ranking(public: List[Card], hand1: HoleCards, hand2: HoleCards, expecte
     print("Shared cards:",  " ".join(str(card) for card in public))
     print("Hole cards 1: ", " ".join(str(card) for card in hand1))
     print("Hole cards 2: ", " ".join(str(card) for card in hand2))
-    print("Hand 1: ", " ".join(str(card) for card in best_hand1.cards))
-    print("Hand 2: ", " ".join(str(card) for card in best_hand2.cards))
+    print("Hand 1: ", best_hand1)
+    print("Hand 2: ", best_hand2)
     print("")
     return False
 
@@ -58,6 +58,34 @@ def test_hand_descriptions(test_cases: List[Tuple[Hand, str]]):
     print(f"{tests_passed} out of {len(test_cases)} tests passed!")
     print("")
 
+# Tests that the batch ranking agrees with best_possible_hand on a number of
+# randomly dealt hands
+def test_batch_ranking(count: int):
+    print("Testing batch ranking:")
+    try:
+        import numpy as np
+    except ImportError:
+        print("numpy isn't installed, skipping.")
+        print("")
+        return
+    deals = []
+    for _ in range(count):
+        deck = Deck()
+        deals.append([deck.draw() for _ in range(7)])
+    indices = np.array([[card.index for card in deal] for deal in deals])
+    scores = rank_many(indices[:, :5], indices[:, 5:])
+    tests_passed = 0
+    for deal, score in zip(deals, scores):
+        hand = best_possible_hand(deal[:5], (deal[5], deal[6]))
+        if hand.score == score:
+            tests_passed += 1
+        else:
+            print(f"Test failed! Expected {hand.score} ({hand}), but got {score}!")
+            print("Cards: ", " ".join(str(card) for card in deal))
+            print("")
+    print(f"{tests_passed} out of {count} tests passed!")
+    print("")
+
 test_rankings([
     # Testing that a high card beats a less-high card
     ([Card(CHAIN, '9'), Card(LOCK, '4'), Card(WEB, '5'), Card(CHAIN, '6'), Card(WEB, '7')],
@@ -556,3 +584,5 @@ test_hand_descriptions([
      "royal flush"
     ),
 ])
+
+test_batch_ranking(10000)
@@ -1,4 +1,5 @@
-from typing import Dict, List, Set
+from bisect import bisect_right
+from typing import Dict, List, Optional, Set, Tuple
 
 from player import Player
 from poker import best_possible_hand, Card, Hand
@@ -24,17 +25,16 @@ class Pot:
             # to hopefully prevent accidental creation of another side pot
             self.max_bet = 10000000000000000000000000000
 
-    # Returns which players win this pot, based on the given community cards
-    def get_winners(self, shared_cards: List[Card]) -> List[Player]:
+    # Returns which players win this pot, based on the showdown's ranking of
+    # everyone's hands
+    def get_winners(self, showdown: 'Showdown') -> List[Player]:
         winners: List[Player] = []
-        best_hand: Hand = None
-        for player in self.players:
-            hand = best_possible_hand(shared_cards, player.cards)
-            if best_hand is None or hand > best_hand:
-                winners = [player]
-                best_hand = hand
-            elif hand == best_hand:
-                winners.append(player)
+        for player in showdown.ranking:
+            if player not in self.players:
+                continue
+            if winners and showdown.hands[player] != showdown.hands[winners[0]]:
+                break
+            winners.append(player)
         return winners
 
     # Returns a new side pot, for when the bet overflows what can be contained
@@ -44,38 +44,132 @@ class Pot:
                     if player.max_bet == self.max_bet}
         return Pot(self.players - excluded)
 
+# The result of a showdown, where each player left in the pot has their best
+# hand worked out once, and every pot and side pot is decided from the same
+# ranking of those hands
+class Showdown:
+    def __init__(self, shared_cards: List[Card], players: Set[Player]) -> None:
+        self.shared_cards = shared_cards
+        # The best hand that each player can make. If the player's hand state
+        # has been kept up to date as the board was dealt, it already knows
+        self.hands: Dict[Player, Hand] = {}
+        for player in players:
+            state = player.hand_state
+            if state is not None and state.count == len(shared_cards) + 2:
+                self.hands[player] = Hand.from_score(state.score)
+            else:
+                self.hands[player] = best_possible_hand(shared_cards,
+                                                        player.cards)
+        # The players, from the best hand to the worst
+        self.ranking: List[Player] = sorted(self.hands, key=self.hands.get,
+                                            reverse=True)
+
+# Adds up what each player won from each pot
+def total_awards(awards: List[Dict[Player, int]]) -> Dict[Player, int]:
+    winners: Dict[Player, int] = {}
+    for won in awards:
+        for winner, amount in won.items():
+            winners[winner] = winners.get(winner, 0) + amount
+    return winners
+
 # A class to manage pots and side pots and who is in each pot and how much
 # each player has bet so far
 class PotManager:
-    def __init__(self):
+    def __init__(self, debug: bool = False) -> None:
         # List of side pots in the game
         # If nobody's all-in, there should only be one pot
         # Higher-priced pots are towards the end of the list
         self.pots: List[Pot] = []
+        # The current bet to be matched, which is the total of every pot's bet
+        self.cur_bet = 0
+        # The amount of money that's in all the pots and side pots
+        self.value = 0
+        # For each pot, the total bet of the pots below it. A player's bet
+        # starts going into a pot once it's higher than the pot's offset
+        self.offsets: List[int] = []
+        # How much each player has put in the pots this hand, including
+        # players who have since folded
+        self.bets: Dict[Player, int] = {}
+        # How many players in the pot still have chips to bet with
+        self.with_chips = 0
+        # How many of those players still need to act this round, because
+        # they haven't bet yet or are behind the current bet
+        self.to_act = 0
+        # Whether to check the running totals against the pots after every
+        # change, to catch bookkeeping bugs
+        self.debug = debug
 
     # Resets the list of pots for a new hand
     def new_hand(self, players: List[Player]) -> None:
         self.pots = [Pot(set(players))]
+        self.cur_bet = 0
+        self.value = 0
+        self.bets = {}
+        self.offsets = [0]
+        self.with_chips, self.to_act = self.count_players()
+        if self.debug:
+            self.check_totals()
 
-    # Returns the current bet to be matched
-    @property
-    def cur_bet(self) -> int:
-        return sum(pot.cur_bet for pot in self.pots)
+    # Returns whether a player still needs to act this round
+    def needs_to_act(self, player: Player) -> bool:
+        return player.balance > 0 and (not player.placed_bet
+                                       or player.cur_bet < self.cur_bet)
 
-    # Returns the amount of money that's in all the pots and side pots
-    @property
-    def value(self) -> int:
-        return sum(pot.amount for pot in self.pots)
+    # Counts how many players in the pot still have chips, and how many of
+    # them still need to act, by looking at every player
+    def count_players(self) -> Tuple[int, int]:
+        with_chips = 0
+        to_act = 0
+        for player in self.pots[0].players:
+            if player.balance > 0:
+                with_chips += 1
+                if self.needs_to_act(player):
+                    to_act += 1
+        return with_chips, to_act
 
     # Increases the current bet to a new given amount
     def increase_bet(self, new_amount: int) -> None:
-        accumulated_bet = 0
+        # The part of the bet already held by the lower pots
+        accumulated_bet = self.offsets[-1]
         while self.pots[-1].max_bet < new_amount:
             self.pots[-1].cur_bet = self.pots[-1].max_bet - accumulated_bet
             accumulated_bet += self.pots[-1].cur_bet
             self.pots.append(self.pots[-1].make_side_pot())
+            self.offsets.append(accumulated_bet)
         new_bet = min(self.pots[-1].max_bet, new_amount)
         self.pots[-1].cur_bet = new_bet - accumulated_bet
+        if new_bet > self.cur_bet:
+            # Everyone behind the new bet has to act again
+            self.cur_bet = new_bet
+            self.with_chips, self.to_act = self.count_players()
+        if self.debug:
+            self.check_totals()
+
+    # Recomputes the running totals from the pots, raising an error if they
+    # don't match. This is run after every change in debug mode
+    def check_totals(self) -> None:
+        offset = 0
+        for i, pot in enumerate(self.pots):
+            if self.offsets[i] != offset:
+                raise AssertionError(f"Pot #{i} has an offset of "
+                                     f"{self.offsets[i]}, but should have "
+                                     f"{offset}.")
+            offset += pot.cur_bet
+        if len(self.offsets) != len(self.pots):
+            raise AssertionError(f"There are {len(self.offsets)} offsets for "
+                                 f"{len(self.pots)} pots.")
+        if self.cur_bet != offset:
+            raise AssertionError(f"The current bet is {self.cur_bet}, but "
+                                 f"should be {offset}.")
+        value = sum(pot.amount for pot in self.pots)
+        if self.value != value:
+            raise AssertionError(f"The pot's value is {self.value}, but "
+                                 f"should be {value}.")
+        with_chips, to_act = self.count_players()
+        if (self.with_chips, self.to_act) != (with_chips, to_act):
+            raise AssertionError(f"{self.with_chips} players have chips and "
+                                 f"{self.to_act} need to act, but it should "
+                                 f"be {with_chips} and {to_act}.")
 
     # Returns all the players that are in the pot
     def in_pot(self) -> Set[Player]:
@@ -92,24 +186,48 @@ class PotManager:
     # Handles a player folding, removing them from every pot that they're
     # eligible for
     def handle_fold(self, player: Player) -> None:
+        if player in self.pots[0].players:
+            if player.balance > 0:
+                self.with_chips -= 1
+            if self.needs_to_act(player):
+                self.to_act -= 1
         for pot in self.pots:
             if player in pot.players:
                 pot.players.remove(player)
+        if self.debug:
+            self.check_totals()
+
+    # Handles a player checking, betting no more money
+    def handle_check(self, player: Player) -> None:
+        if self.needs_to_act(player):
+            self.to_act -= 1
+        player.placed_bet = True
+        if self.debug:
+            self.check_totals()
 
     # Handles a player calling the current bet
     def handle_call(self, player: Player) -> None:
-        new_amount = player.bet(min(player.max_bet, self.cur_bet))
-        old_bet = player.cur_bet - new_amount
-        pot_index = 0
-        while new_amount > 0:
-            cur_pot = self.pots[pot_index]
-            old_bet -= cur_pot.cur_bet
-            if old_bet < 0:
-                cur_pot.amount -= old_bet
-                new_amount += old_bet
-                old_bet = 0
+        if self.needs_to_act(player):
+            self.to_act -= 1
+        old_bet = player.cur_bet
+        paid = player.bet(min(player.max_bet, self.cur_bet))
+        self.value += paid
+        self.bets[player] = self.bets.get(player, 0) + paid
+        new_bet = player.cur_bet
+        # Starting from the pot that the player's old bet reached, add to each
+        # pot the part of the new bet that falls within it
+        pot_index = bisect_right(self.offsets, old_bet) - 1
+        while pot_index < len(self.pots) and self.offsets[pot_index] < new_bet:
+            pot = self.pots[pot_index]
+            pot_start = self.offsets[pot_index]
+            pot_end = pot_start + pot.cur_bet
+            pot.amount += min(new_bet, pot_end) - max(old_bet, pot_start)
             pot_index += 1
         player.placed_bet = True
+        if player.balance == 0:
+            self.with_chips -= 1
+        if self.debug:
+            self.check_totals()
 
     # Handles a player raising the current bet to a given amount
     def handle_raise(self, player: Player, new_amount: int) -> None:
@@ -121,13 +239,36 @@ class PotManager:
     def pay_blind(self, player: Player, blind: int) -> bool:
         self.increase_bet(blind)
         self.handle_call(player)
+        # Paying the blind doesn't count as acting, so the player still gets
+        # to bet when it comes around to them
         player.placed_bet = False
+        if player.balance > 0:
+            self.to_act += 1
+        if self.debug:
+            self.check_totals()
         return player.balance == 0
 
     # Returns whether the betting round is over, which is where every player
     # who can bet has made a bet and have matched the same bet
     def round_over(self) -> bool:
-        if self.betting_over():
+        if self.debug and (self.to_act == 0) != self.scan_round_over():
+            raise AssertionError("round_over disagrees with a scan of the "
+                                 "players.")
+        return self.to_act == 0
+
+    # Returns whether all betting is over, if all but one player has folded or
+    # has gone all-in
+    def betting_over(self) -> bool:
+        over = self.with_chips <= 1 and self.to_act == 0
+        if self.debug and over != self.scan_betting_over():
+            raise AssertionError("betting_over disagrees with a scan of the "
+                                 "players.")
+        return over
+
+    # Works out round_over by looking at every player. Only used to check the
+    # counts in debug mode
+    def scan_round_over(self) -> bool:
+        if self.scan_betting_over():
             return True
         for player in self.pots[0].players:
             if player.balance == 0:
@@ -136,9 +277,9 @@ class PotManager:
                 return False
         return True
 
-    # Returns whether all betting is over, if all but one player has folded or
-    # has gone all-in
-    def betting_over(self) -> bool:
+    # Works out betting_over by looking at every player. Only used to check
+    # the counts in debug mode
+    def scan_betting_over(self) -> bool:
         players_left_betting = False
         for player in self.pots[0].players:
             if player.balance > 0:
@@ -149,19 +290,66 @@ class PotManager:
                 players_left_betting = True
         return True
 
-    # Returns the winners of the pot, and the amounts that they won
-    def get_winners(self, shared_cards: List[Card]) -> Dict[Player, int]:
-        winners: Dict[Player, int] = {}
+    # Evaluates the hands of everyone left in the pot for the showdown
+    def showdown(self, shared_cards: List[Card]) -> Showdown:
+        return Showdown(shared_cards, self.in_pot())
+
+    # Returns what each pot pays out, from the main pot up through the side
+    # pots, as the amount each of the pot's winners takes from it
+    def awards(self, showdown: Showdown) -> List[Dict[Player, int]]:
+        awards: List[Dict[Player, int]] = []
         for pot in self.pots:
-            pot_winners = pot.get_winners(shared_cards)
-            if len(pot_winners) == 0:
-                continue
-            pot_won = pot.amount // len(pot_winners)
-            if pot_won > 0:
-                for winner in pot_winners:
-                    winners.setdefault(winner, 0)
-                    winners[winner] += pot_won
-        return winners
+            pot_winners = pot.get_winners(showdown)
+            won: Dict[Player, int] = {}
+            if len(pot_winners) > 0:
+                pot_won = pot.amount // len(pot_winners)
+                if pot_won > 0:
+                    won = {winner: pot_won for winner in pot_winners}
+            awards.append(won)
+        return awards
+
+    # Returns the player whose bet nobody else matched, and how much of it went
+    # unmatched, or None if every bet was matched
+    def uncalled_bet(self) -> Optional[Tuple[Player, int]]:
+        if not self.bets:
+            return None
+        ranked = sorted(self.bets.values(), reverse=True)
+        called = ranked[1] if len(ranked) > 1 else 0
+        if ranked[0] == called:
+            return None
+        player = max(self.bets, key=self.bets.get)
+        return player, ranked[0] - called
+
+    # Takes the uncalled bet out of what the pots pay out, since it's returned
+    # to the player who bet it rather than won. It's always in the highest
+    # pots that player takes. Returns the awards without it, and the uncalled
+    # bet, if there was one
+    def take_uncalled(self, awards: List[Dict[Player, int]]
+                      ) -> Tuple[List[Dict[Player, int]],
+                                 Optional[Tuple[Player, int]]]:
+        uncalled = self.uncalled_bet()
+        if uncalled is None:
+            return awards, None
+        player, left = uncalled
+        won_awards = [dict(won) for won in awards]
+        for won in reversed(won_awards):
+            if left == 0:
+                break
+            if player in won:
+                taken = min(left, won[player])
+                won[player] -= taken
+                left -= taken
+                if won[player] == 0:
+                    del won[player]
+        if left == uncalled[1]:
+            # The player folded, so what they put in past the last call
+            # stayed in the pot for its winner
+            return awards, None
+        return won_awards, (player, uncalled[1] - left)
+
+    # Returns the winners of the pot, and the amounts that they won
+    def get_winners(self, showdown: Showdown) -> Dict[Player, int]:
+        return total_awards(self.awards(showdown))
 
     # Advances to the next round of betting
     def next_round(self) -> None:
@@ -173,3 +361,8 @@ class PotManager:
             player.cur_bet = 0
         self.pots[-1].max_bet = min(player.max_bet
                                     for player in self.pots[-1].players)
+        self.cur_bet = 0
+        self.offsets = [0] * len(self.pots)
+        self.with_chips, self.to_act = self.count_players()
+        if self.debug:
+            self.check_totals()
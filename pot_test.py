@@ -0,0 +1,72 @@
+from typing import List
+
+from player import Player
+from pot import PotManager
+
+# Returns players with the given balances, named a, b, c and so on
+def make_players(balances: List[int]) -> List[Player]:
+    players = []
+    for i, balance in enumerate(balances):
+        player = Player(i, chr(ord('a') + i))
+        player.balance = balance
+        players.append(player)
+    return players
+
+# Tests that raising once there's a side pot only puts the new part of the bet
+# in the top pot. It used to ignore the bets held by the lower pots, so the
+# top pot asked for too much and the pots ended up holding more chips than
+# were bet
+def test_raise_over_side_pot() -> bool:
+    balances = [50, 200, 200]
+    players = make_players(balances)
+    a, b, c = players
+    pot = PotManager(debug=True)
+    pot.new_hand(players)
+    try:
+        # a's all in makes a side pot for b and c, which b and c raise
+        pot.handle_raise(a, 50)
+        pot.handle_raise(b, 50)
+        pot.handle_raise(c, 50)
+        pot.handle_call(b)
+    except AssertionError as error:
+        print("Test failed!", error)
+        return False
+    bet = sum(balances) - sum(player.balance for player in players)
+    amounts = [side_pot.amount for side_pot in pot.pots]
+    if pot.cur_bet != 150 or sum(amounts) != bet or amounts != [150, 200]:
+        print("Test failed! Expected a bet of $150 and pots of [150, 200], but "
+              f"the bet is ${pot.cur_bet} and the pots are {amounts}.")
+        pot.debug_print()
+        return False
+    return True
+
+# Tests that a bet nobody could match is returned to the player who made it,
+# rather than counted as won
+def test_uncalled_bet() -> bool:
+    players = make_players([225, 1000, 1000])
+    a, b, c = players
+    pot = PotManager(debug=True)
+    pot.new_hand(players)
+    pot.handle_raise(a, 225)
+    pot.handle_raise(b, 406)
+    pot.handle_fold(c)
+    amounts = [side_pot.amount for side_pot in pot.pots]
+    uncalled = pot.uncalled_bet()
+    if amounts != [450, 406] or uncalled != (b, 406):
+        print("Test failed! Expected pots of [450, 406] with $406 uncalled, "
+              f"but the pots are {amounts} and the uncalled bet is",
+              uncalled and (uncalled[0].name, uncalled[1]))
+        return False
+    passed = True
+    for awards, expected in [([{a: 450}, {b: 406}], [{a: 450}, {}]),
+                             ([{b: 450}, {b: 406}], [{b: 450}, {}])]:
+        won, returned = pot.take_uncalled(awards)
+        if won != expected or returned != (b, 406):
+            print("Test failed! Expected", expected, "to be won, but got", won)
+            passed = False
+    return passed
+
+print("Testing side pots:")
+tests = [test_raise_over_side_pot, test_uncalled_bet]
+tests_passed = sum(test() for test in tests)
+print(f"{tests_passed}/{len(tests)} tests passed.")
@@ -0,0 +1,139 @@
+from collections import namedtuple
+from typing import Callable, List, Optional
+import argparse
+import json
+import os
+import pickle
+import time
+
+from game import Game
+
+# What happened when a log was replayed: the game it left behind, how many
+# actions and hands were replayed, and the actions that failed, as
+# (action number, error) pairs
+ReplayResult = namedtuple("ReplayResult", ["game", "actions", "hands", "errors"])
+
+# Reads the actions from an action log, one per line. The last line can be
+# cut short by a crash, in which case it and anything after it is ignored
+def read_log(path: str) -> List[list]:
+    entries = []
+    with open(path) as log_file:
+        for line in log_file:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                break
+    return entries
+
+# Loads the game a log's actions continue on from: the snapshot next to the
+# log if there is one, or a new game
+def load_snapshot(log_path: str) -> Game:
+    snapshot_path = os.path.splitext(log_path)[0] + ".snapshot"
+    try:
+        with open(snapshot_path, "rb") as snapshot_file:
+            return pickle.load(snapshot_file)
+    except FileNotFoundError:
+        return Game()
+
+# Re-runs a game's actions, without saying anything to anyone. Actions the
+# game has already taken are skipped, so a log can be replayed on top of its
+# snapshot. Replaying stops after the action numbered until, if it's given.
+# Each action's messages are passed to on_messages, if it's given. With debug
+# on, the pot's running totals are checked after every change
+def replay(entries: List[list], game: Optional[Game] = None,
+           debug: bool = False, until: Optional[int] = None,
+           on_messages: Optional[Callable[[list, List[str]], None]] = None
+           ) -> ReplayResult:
+    if game is None:
+        game = Game()
+    # Replaying actions shouldn't log them again
+    recording = game.recording
+    game.recording = False
+    actions = 0
+    hands = 0
+    errors = []
+    for entry in entries:
+        if entry[0] <= game.actions_taken:
+            continue
+        if until is not None and entry[0] > until:
+            break
+        # Starting a new game makes a new pot, so turn debugging on each time
+        game.pot.debug = debug
+        try:
+            messages = game.replay(entry)
+            # Some actions, like add_player, don't say anything
+            if not isinstance(messages, list):
+                messages = []
+        except Exception as error:
+            # The action failed the same way when it was first taken, so the
+            # game is in the same state it was then
+            errors.append((entry[0], f"{type(error).__name__}: {error}"))
+            messages = []
+        actions += 1
+        if entry[1] == "deal":
+            hands += 1
+        if on_messages is not None:
+            on_messages(entry, messages)
+    game.recording = recording
+    return ReplayResult(game, actions, hands, errors)
+
+# Returns the action logs at the given paths, looking inside directories
+def find_logs(paths: List[str]) -> List[str]:
+    logs = []
+    for path in paths:
+        if os.path.isdir(path):
+            logs += sorted(os.path.join(path, filename)
+                           for filename in os.listdir(path)
+                           if filename.endswith(".log"))
+        else:
+            logs.append(path)
+    return logs
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Replays games from their action logs, without Discord, "
+                    "to reproduce disputed hands and pot bugs, or to re-run "
+                    "an archive of hands as a regression test")
+    parser.add_argument("paths", nargs="+",
+                        help="action logs, or directories of them")
+    parser.add_argument("--debug", action="store_true",
+                        help="check the pot's running totals after every "
+                             "change (slower)")
+    parser.add_argument("--until", type=int, default=None,
+                        help="stop after the action with this number")
+    parser.add_argument("--verbose", action="store_true",
+                        help="print every action and what the bot said")
+    args = parser.parse_args()
+
+    def show(entry: list, messages: List[str]) -> None:
+        print(f"#{entry[0]} {entry[1]}"
+              + "".join(f" {arg}" for arg in entry[2:]))
+        for message in messages:
+            print("    " + message.replace("\n", "\n    "))
+
+    actions = 0
+    hands = 0
+    problems = []
+    start = time.perf_counter()
+    logs = find_logs(args.paths)
+    for path in logs:
+        result = replay(read_log(path), load_snapshot(path), args.debug,
+                        args.until, show if args.verbose else None)
+        actions += result.actions
+        hands += result.hands
+        problems += [f"{path}, action {number}: {error}"
+                     for number, error in result.errors]
+        if len(logs) == 1:
+            print(result.game.table_view())
+    elapsed = time.perf_counter() - start
+
+    print(f"Replayed {actions} actions and {hands} hands from {len(logs)} "
+          f"logs in {elapsed:.2f}s ({actions / elapsed if elapsed else 0:,.0f} "
+          "actions/s)")
+    if problems:
+        print(f"{len(problems)} actions failed:")
+        for problem in problems:
+            print(f"  {problem}")
+
+if __name__ == "__main__":
+    main()
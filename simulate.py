@@ -0,0 +1,242 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import random
+import time
+
+from game import Game, GameState
+from player import Player
+
+# An action for a player to take: "check", "call", "raise", "all-in" or
+# "fold", along with the amount to raise by for raises
+Action = Tuple[str, int]
+
+# A policy picks the current player's action. It's only offered actions that
+# the bot would accept from a real player
+Policy = Callable[[Game, random.Random], Action]
+
+# Returns the actions that the bot would let the current player take, and the
+# most they can raise by
+def legal_actions(game: Game) -> Tuple[List[str], int]:
+    player = game.current_player
+    actions = ["all-in", "fold"]
+    if player.cur_bet == game.cur_bet:
+        actions.append("check")
+    if player.max_bet > game.cur_bet:
+        actions.append("call")
+        actions.append("raise")
+    return actions, player.max_bet - game.cur_bet
+
+# Picks any legal action, raising by a random amount
+def random_policy(game: Game, rng: random.Random) -> Action:
+    actions, max_raise = legal_actions(game)
+    action = rng.choice(actions)
+    return action, rng.randint(1, max_raise) if action == "raise" else 0
+
+# Never raises or folds, only checking or calling
+def passive_policy(game: Game, rng: random.Random) -> Action:
+    actions, _ = legal_actions(game)
+    if "check" in actions:
+        return "check", 0
+    if "call" in actions:
+        return "call", 0
+    return "all-in", 0
+
+# Raises the size of the big blind half the time, and goes all in now and then
+def aggressive_policy(game: Game, rng: random.Random) -> Action:
+    actions, max_raise = legal_actions(game)
+    choice = rng.random()
+    if choice < 0.1:
+        return "all-in", 0
+    if choice < 0.6 and "raise" in actions:
+        return "raise", min(max_raise, game.options["blind"] * 2)
+    return passive_policy(game, rng)
+
+# Checks when it can, and folds otherwise
+def tight_policy(game: Game, rng: random.Random) -> Action:
+    actions, _ = legal_actions(game)
+    if "check" in actions:
+        return "check", 0
+    if rng.random() < 0.2 and "call" in actions:
+        return "call", 0
+    return "fold", 0
+
+POLICIES: Dict[str, Policy] = {
+    "random": random_policy,
+    "passive": passive_policy,
+    "aggressive": aggressive_policy,
+    "tight": tight_policy,
+}
+
+# Has the current player take an action, the same way the bot would
+def take_action(game: Game, action: Action) -> List[str]:
+    name, amount = action
+    if name == "check":
+        return game.check()
+    elif name == "call":
+        return game.call()
+    elif name == "raise":
+        return game.raise_bet(amount)
+    elif name == "all-in":
+        return game.all_in()
+    return game.fold()
+
+# Plays one hand, asking each player's policy for their actions
+def play_hand(game: Game, policies: Dict[Player, Policy],
+              rng: random.Random) -> None:
+    game.deal_hands()
+    while game.state not in (GameState.NO_HANDS, GameState.NO_GAME):
+        policy = policies[game.current_player]
+        take_action(game, policy(game, rng))
+
+# The outcome of one or more tables
+TableResult = namedtuple("TableResult", ["hands", "seconds", "problems"])
+
+# Sits a table of players down with the given policies, and plays until the
+# game ends or the given number of hands have been played. Chip counts are
+# checked after every hand, and any problem is reported with the seed and hand
+# number needed to reproduce it. If record_dir is given, the table's action log
+# is saved there, for replay.py to replay
+def play_table(seed: int, hands: int, policy_names: List[str],
+               buy_in: int, debug: bool = False,
+               record_dir: Optional[str] = None) -> TableResult:
+    rng = random.Random(seed)
+    random.seed(seed)
+    game = Game()
+    game.recording = record_dir is not None
+    game.set_option("buy-in", buy_in)
+    # Blinds only go up with the clock, which would make runs unrepeatable
+    game.set_option("raise-delay", 0)
+    game.pot.debug = debug
+    for i in range(len(policy_names)):
+        game.add_player(i, f"player{i}")
+    players = list(game.players)
+    policies = {player: POLICIES[name]
+                for player, name in zip(players, policy_names)}
+    game.start()
+
+    problems: List[str] = []
+    played = 0
+    start = time.perf_counter()
+    while played < hands and game.state != GameState.NO_GAME:
+        chips_before = sum(player.balance for player in players)
+        try:
+            play_hand(game, policies, rng)
+        except Exception as error:
+            problems.append(f"seed {seed}, hand {played}: "
+                            f"{type(error).__name__}: {error}")
+            break
+        played += 1
+        chips_after = sum(player.balance for player in players)
+        # Split pots can drop odd chips, but never more than one per player
+        # for each pot
+        if chips_after > chips_before:
+            problems.append(f"seed {seed}, hand {played - 1}: "
+                            f"{chips_after - chips_before} chips were created")
+        elif chips_before - chips_after >= len(players) * len(game.pot.pots):
+            problems.append(f"seed {seed}, hand {played - 1}: "
+                            f"{chips_before - chips_after} chips were lost")
+        if any(player.balance < 0 for player in players):
+            problems.append(f"seed {seed}, hand {played - 1}: "
+                            "a player's balance went negative")
+    elapsed = time.perf_counter() - start
+    if record_dir is not None:
+        with open(os.path.join(record_dir, f"{seed}.log"), "w") as log_file:
+            for entry in game.action_log:
+                log_file.write(json.dumps(entry) + "\n")
+    return TableResult(played, elapsed, problems)
+
+# Plays a batch of tables in a worker process, returning the worker's process
+# id and the combined result of its tables
+def play_tables(seeds: List[int], hands: int, policy_names: List[str],
+                buy_in: int, debug: bool,
+                record_dir: Optional[str]) -> Tuple[int, TableResult]:
+    played = 0
+    seconds = 0.0
+    problems: List[str] = []
+    for seed in seeds:
+        result = play_table(seed, hands, policy_names, buy_in, debug,
+                            record_dir)
+        played += result.hands
+        seconds += result.seconds
+        problems += result.problems
+    return os.getpid(), TableResult(played, seconds, problems)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Plays poker games between scripted players, without "
+                    "Discord, to load test the game engine and look for "
+                    "chip accounting bugs")
+    parser.add_argument("--tables", type=int, default=100,
+                        help="how many tables to play")
+    parser.add_argument("--hands", type=int, default=1000,
+                        help="the most hands to play at each table")
+    parser.add_argument("--players", type=int, default=6,
+                        help="how many players sit at each table")
+    parser.add_argument("--policies", default="random",
+                        help="a comma separated list of the policies the "
+                             "players use, repeated around the table, out of "
+                             f"{', '.join(POLICIES)}")
+    parser.add_argument("--buy-in", type=int, default=250,
+                        help="how many chips each player starts with")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="how many processes to use (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="the seed of the first table")
+    parser.add_argument("--batch", type=int, default=10,
+                        help="how many tables to hand a worker at once")
+    parser.add_argument("--debug", action="store_true",
+                        help="check the pot's running totals after every "
+                             "change (slower)")
+    parser.add_argument("--record", default=None, metavar="DIR",
+                        help="save each table's action log to this directory, "
+                             "to replay later with replay.py")
+    args = parser.parse_args()
+
+    names = args.policies.split(",")
+    for name in names:
+        if name not in POLICIES:
+            parser.error(f"there's no policy called '{name}'")
+    if args.players < 2:
+        parser.error("there must be at least two players at each table")
+    policy_names = [names[i % len(names)] for i in range(args.players)]
+    if args.record is not None:
+        os.makedirs(args.record, exist_ok=True)
+
+    seeds = list(range(args.seed, args.seed + args.tables))
+    batches = [seeds[i:i + args.batch] for i in range(0, len(seeds), args.batch)]
+    by_worker: Dict[int, List[TableResult]] = {}
+    problems: List[str] = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        jobs = [executor.submit(play_tables, batch, args.hands, policy_names,
+                                args.buy_in, args.debug, args.record)
+                for batch in batches]
+        for job in jobs:
+            pid, result = job.result()
+            by_worker.setdefault(pid, []).append(result)
+            problems += result.problems
+    elapsed = time.perf_counter() - start
+
+    total_hands = 0
+    for pid, results in sorted(by_worker.items()):
+        hands = sum(result.hands for result in results)
+        seconds = sum(result.seconds for result in results)
+        total_hands += hands
+        print(f"Worker {pid}: {hands} hands in {seconds:.2f}s "
+              f"({hands / seconds if seconds else 0:,.0f} hands/s)")
+    print(f"Total: {total_hands} hands in {elapsed:.2f}s "
+          f"({total_hands / elapsed:,.0f} hands/s)")
+
+    if problems:
+        print(f"{len(problems)} problems found:")
+        for problem in problems:
+            print(f"  {problem}")
+    else:
+        print("No problems found.")
+
+if __name__ == "__main__":
+    main()
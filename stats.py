@@ -0,0 +1,205 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set
+import asyncio
+import sqlite3
+import traceback
+
+from player import Player
+
+# The most players' stats to write in one transaction
+BATCH_SIZE = 500
+
+# What one player did in one hand: whether they put chips in voluntarily before
+# the flop (VPIP), and raised before the flop (PFR), whether they went to the
+# showdown and won at it, how many chips they won or lost, and the most they
+# won from the pot
+HandRow = namedtuple("HandRow", ["user_id", "name", "vpip", "pfr", "showdown",
+                                 "won_showdown", "net", "won"])
+
+# The columns of the players table, in order
+COLUMNS = ("user_id", "name", "hands", "vpip", "pfr", "showdowns",
+           "showdowns_won", "net_chips", "biggest_pot")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    user_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    hands INTEGER NOT NULL,
+    vpip INTEGER NOT NULL,
+    pfr INTEGER NOT NULL,
+    showdowns INTEGER NOT NULL,
+    showdowns_won INTEGER NOT NULL,
+    net_chips INTEGER NOT NULL,
+    biggest_pot INTEGER NOT NULL
+);
+-- Players are only ever looked up in memory and written by user id, so the
+-- table needs no other indexes. Older databases had two that nothing used
+DROP INDEX IF EXISTS players_by_net_chips;
+DROP INDEX IF EXISTS players_by_hands;
+"""
+
+# Keeps track of what each player does during one hand, for their stats. The
+# game tells it about each event as the hand is played
+class HandStats:
+    def __init__(self, players: List[Player]) -> None:
+        # The players dealt in, and their chips when the hand was dealt
+        self.start: Dict[Player, int] = {player: player.balance
+                                         for player in players}
+        # The players who put chips in voluntarily, and who raised, before
+        # the flop
+        self.vpip: Set[Player] = set()
+        self.pfr: Set[Player] = set()
+        # The players who showed their hands, and what each winner won
+        self.showdown: Set[Player] = set()
+        self.won: Dict[Player, int] = {}
+
+    # Notes chips a player was given during the hand, which aren't winnings
+    def add_chips(self, player: Player, amount: int) -> None:
+        if player in self.start:
+            self.start[player] += amount
+
+    # Notes a player putting chips in before the flop without being forced to
+    def voluntary(self, player: Player, raised: bool) -> None:
+        self.vpip.add(player)
+        if raised:
+            self.pfr.add(player)
+
+    # Notes the players who showed their hands at the showdown
+    def show(self, players: Set[Player]) -> None:
+        self.showdown |= players
+
+    # Notes who won the hand, and how much
+    def award(self, winners: Dict[Player, int]) -> None:
+        self.won = winners
+
+    def rows(self) -> List[HandRow]:
+        return [HandRow(player.user_id, player.name, player in self.vpip,
+                        player in self.pfr, player in self.showdown,
+                        player in self.showdown and player in self.won,
+                        player.balance - start, self.won.get(player, 0))
+                for player, start in self.start.items()]
+
+# A player's stats over every game they've played
+class PlayerStats:
+    def __init__(self, user_id: int, name: str, hands: int = 0, vpip: int = 0,
+                 pfr: int = 0, showdowns: int = 0, showdowns_won: int = 0,
+                 net_chips: int = 0, biggest_pot: int = 0) -> None:
+        self.user_id = user_id
+        self.name = name
+        self.hands = hands
+        self.vpip = vpip
+        self.pfr = pfr
+        self.showdowns = showdowns
+        self.showdowns_won = showdowns_won
+        self.net_chips = net_chips
+        self.biggest_pot = biggest_pot
+
+    def add(self, row: HandRow) -> None:
+        self.name = row.name
+        self.hands += 1
+        self.vpip += row.vpip
+        self.pfr += row.pfr
+        self.showdowns += row.showdown
+        self.showdowns_won += row.won_showdown
+        self.net_chips += row.net
+        self.biggest_pot = max(self.biggest_pot, row.won)
+
+    # Returns the stats as a row of the players table
+    def values(self) -> tuple:
+        return tuple(getattr(self, column) for column in COLUMNS)
+
+    def __str__(self) -> str:
+        hands = max(self.hands, 1)
+        return (f"{self.name} has played {self.hands} hands, "
+                f"VPIP {self.vpip / hands:.0%}, PFR {self.pfr / hands:.0%}, "
+                f"won {self.showdowns_won} of {self.showdowns} showdowns, "
+                f"net ${self.net_chips}, biggest pot ${self.biggest_pot}.")
+
+# Returns the rows to write for a batch of changes. Only the latest stats for
+# each player need writing
+def latest_rows(batch: List[tuple]) -> List[tuple]:
+    return list({values[0]: values for values in batch}.values())
+
+# Keeps every player's stats in SQLite, with a copy of them all in memory, so
+# looking a player up never touches the disk. Changes are queued and written
+# in batches by one writer, on its own thread and connection, with the
+# database in WAL mode so readers elsewhere aren't blocked
+class StatsStore:
+    def __init__(self, path: str, batch_size: int = BATCH_SIZE) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        connection = sqlite3.connect(path)
+        with connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+        # The in memory index of every player's stats, by user id
+        self.players: Dict[int, PlayerStats] = {}
+        for values in connection.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM players"):
+            self.players[values[0]] = PlayerStats(*values)
+        connection.close()
+        self.queue: Optional[asyncio.Queue] = None
+        self.writer_task: Optional[asyncio.Future] = None
+        # The writer's thread, and its connection, made on that thread
+        self.writer = ThreadPoolExecutor(max_workers=1)
+        self.connection: Optional[sqlite3.Connection] = None
+
+    # Returns a player's stats, or None if they haven't played a hand
+    def get(self, user_id: int) -> Optional[PlayerStats]:
+        return self.players.get(user_id)
+
+    # Adds a finished hand's rows to the players' stats, and queues the
+    # changes to be written
+    def add(self, rows: List[HandRow]) -> None:
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+            self.writer_task = asyncio.ensure_future(self.write_queued())
+        for row in rows:
+            stats = self.players.get(row.user_id)
+            if stats is None:
+                stats = PlayerStats(row.user_id, row.name)
+                self.players[row.user_id] = stats
+            stats.add(row)
+            self.queue.put_nowait(stats.values())
+
+    async def write_queued(self) -> None:
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await loop.run_in_executor(self.writer, self.write_batch,
+                                           latest_rows(batch))
+            except Exception:
+                # The stats are still right in memory, and the next write of
+                # each player's stats will catch the database up
+                traceback.print_exc()
+
+    # Writes everything still queued, waits for the writer to finish, and
+    # closes the database. This runs after the event loop has stopped, so it
+    # doesn't use it
+    def close(self) -> None:
+        batch = []
+        while self.queue is not None and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        if batch:
+            self.writer.submit(self.write_batch, latest_rows(batch))
+        self.writer.submit(self.close_connection)
+        self.writer.shutdown(wait=True)
+
+    def close_connection(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def write_batch(self, rows: List[tuple]) -> None:
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path)
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO players ({', '.join(COLUMNS)}) "
+                f"VALUES ({placeholders})", rows)